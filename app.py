@@ -1,16 +1,29 @@
 # app.py
 from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import logging
 import asyncio
-import base64
-import re
+import functools
 import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 
 # Import services and config
-from services import stt, llm, tts
-from config import ASSEMBLYAI_API_KEY, GEMINI_API_KEY, MURF_API_KEY, SERPAPI_API_KEY, NEWSAPI_API_KEY
+from services import stt, llm, tts, codec, metrics, search, admission, sessions
+from services.prefetch import SpeculativePrefetcher
+from services.router import INTENT_NEWS, INTENT_WEB, INTENT_CHAT
+from services.pipeline import SentenceSplitter, split_sentences, SynthesisStage, AudioSink, TurnManager, AUDIO_PROTOCOLS
+from config import (
+    ASSEMBLYAI_API_KEY, GEMINI_API_KEY, MURF_API_KEY, SERPAPI_API_KEY, NEWSAPI_API_KEY,
+    UPSTREAM_WORKERS, LLM_STREAMING, TTS_CONCURRENCY, TTS_GLOBAL_CONCURRENCY, TTS_PREWARM, PROVIDER_WARMUP,
+    STT_CHUNK_MS, STT_MAX_CHUNK_MS, STT_QUEUE_FRAMES, STT_OVERFLOW_POLICY,
+    STT_VAD_THRESHOLD, STT_VAD_HANGOVER_MS, STT_VAD_PREROLL_MS, STT_POOL_SIZE, STT_POOL_IDLE_SECONDS,
+    SPECULATIVE_PREFETCH, PREFETCH_DEBOUNCE_MS, PREFETCH_MIN_WORDS, TTS_OUTPUT_FORMAT, TTS_OUTPUT_BITRATE_KBPS,
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,18 +34,148 @@ app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
+# Bounded pool for the blocking upstream SDK calls (Gemini, SerpAPI, NewsAPI, Murf).
+# Keeps them off the event loop so one slow turn never stalls other sockets.
+upstream_executor = ThreadPoolExecutor(max_workers=UPSTREAM_WORKERS, thread_name_prefix="upstream")
+
+# Pre-connected AssemblyAI sessions for the server-side key
+transcriber_pool = stt.TranscriberPool(STT_POOL_SIZE, STT_POOL_IDLE_SECONDS)
+
+# Caps in-flight Murf requests across all sessions
+tts_global_limit = asyncio.Semaphore(TTS_GLOBAL_CONCURRENCY)
+
+async def run_blocking(func, *args, **kwargs):
+    """Runs a blocking upstream call on the dedicated executor and awaits its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(upstream_executor, functools.partial(func, *args, **kwargs))
+
+# Upstreams each kind of turn depends on (quick replies have pre-warmed audio)
+TURN_PROVIDERS = {
+    INTENT_NEWS: ("newsapi", "gemini", "murf"),
+    INTENT_WEB: ("serpapi", "gemini", "murf"),
+    INTENT_CHAT: ("gemini", "murf"),
+}
+
+def unavailable_provider(intent: str, api_keys: dict) -> Optional[str]:
+    """The first provider the turn needs whose circuit breaker is open, if any."""
+    for provider in TURN_PROVIDERS.get(intent, ()):
+        if admission.circuit_open(provider, api_keys.get(provider)):
+            return provider
+    return None
+
+async def generate_reply(
+    text: str,
+    chat_history: list,
+    api_keys: dict,
+    persona: str,
+    session_id: str = llm.DEFAULT_SESSION,
+    on_chunk=None,
+    cancel_event=None,
+    trace=None,
+):
+    """
+    Routes a transcript to news, web search or plain chat without blocking the event loop.
+    If on_chunk is given, Gemini's reply is streamed into it (from a worker thread).
+    Setting cancel_event aborts the upstream calls of an interrupted turn.
+    Stage timings go to trace (a metrics.TurnTrace) when given.
+    Raises admission.AdmissionError without calling anything when a needed
+    provider's circuit is open, or when a call is refused on the way.
+    """
+    with metrics.timed("route", trace):
+        intent = llm.route(text, persona).intent
+    blocked = unavailable_provider(intent, api_keys)
+    if blocked:
+        admission.refuse(blocked, admission.REASON_CIRCUIT_OPEN)
+    if intent == INTENT_NEWS:
+        return await run_blocking(
+            llm.get_news_response,
+            text, chat_history, api_key=api_keys.get("gemini"), news_api_key=api_keys.get("newsapi"),
+            persona=persona, session_id=session_id, on_chunk=on_chunk, cancel_event=cancel_event, trace=trace
+        )
+    if intent == INTENT_WEB:
+        return await run_blocking(
+            llm.get_web_response,
+            text, chat_history, gemini_api_key=api_keys.get("gemini"), serp_api_key=api_keys.get("serpapi"),
+            persona=persona, session_id=session_id, on_chunk=on_chunk, cancel_event=cancel_event, trace=trace
+        )
+    return await run_blocking(
+        llm.get_llm_response,
+        text, chat_history, api_key=api_keys.get("gemini"), persona=persona,
+        session_id=session_id, on_chunk=on_chunk, cancel_event=cancel_event
+    )
+
+PIPELINE_ERROR_REPLY = "Sorry, I hit a snag while processing your request."
+UPSTREAM_UNAVAILABLE_REPLY = "I'm having trouble reaching my services right now. Give me a moment and try again."
+STT_UNAVAILABLE_REPLY = "I can't hear you right now: speech recognition is unavailable. Please try again later."
+FALLBACK_AUDIO_PATH = "static/fallback.mp3"
+
+@functools.lru_cache(maxsize=1)
+def fallback_audio() -> bytes:
+    """The pre-recorded clip played when an upstream is down (empty if the file is missing)."""
+    try:
+        with open(FALLBACK_AUDIO_PATH, "rb") as f:
+            return f.read()
+    except OSError as e:
+        logging.warning("Fallback audio unavailable: %s", e)
+        return b""
+
+def prewarm_canned_audio():
+    """Pre-synthesizes every quick reply and canned error line so they play without a Murf call."""
+    # Replies are spoken sentence by sentence, so that is how they are cached
+    lines = llm.canned_replies() + [PIPELINE_ERROR_REPLY]
+    fetched = tts.prewarm([sentence for line in lines for sentence in split_sentences(line)], MURF_API_KEY)
+    logging.info("TTS cache pre-warmed (%d new clips).", fetched)
+
+def warm_up_providers():
+    """
+    Loads the SDKs of the providers that have a server-side key so the first
+    turn does not pay for their imports. Importing the app stays cheap; this
+    is the explicit hook (run in the background after startup).
+    """
+    started = time.perf_counter()
+    for key, service in (
+        (GEMINI_API_KEY, llm), (ASSEMBLYAI_API_KEY, stt), (MURF_API_KEY, tts), (SERPAPI_API_KEY, search),
+    ):
+        if key:
+            service.warm_up()
+    logging.info("Provider SDKs warmed up in %.2fs.", time.perf_counter() - started)
+
+@app.on_event("startup")
+async def start_background_warmup():
+    loop = asyncio.get_running_loop()
+    if PROVIDER_WARMUP:
+        loop.run_in_executor(upstream_executor, warm_up_providers)
+    if ASSEMBLYAI_API_KEY:
+        loop.run_in_executor(upstream_executor, transcriber_pool.warm, ASSEMBLYAI_API_KEY)
+    if TTS_PREWARM and MURF_API_KEY:
+        loop.run_in_executor(upstream_executor, prewarm_canned_audio)
+
+@app.on_event("shutdown")
+def shutdown_upstream_executor():
+    upstream_executor.shutdown(wait=False, cancel_futures=True)
+    tts.close_clients()
+    transcriber_pool.close()
+    logging.info("AssemblyAI session pool stats: %s", transcriber_pool.stats)
+
 @app.get("/")
 async def home(request: Request):
     """Serves the main HTML page."""
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.TemplateResponse(request, "index.html")
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """Handles WebSocket connection for real-time transcription and voice response."""
     await websocket.accept()
     logging.info("WebSocket client connected.")
+    metrics.active_sessions.inc()
 
     loop = asyncio.get_event_loop()
+    session_id = uuid.uuid4().hex
     chat_history = []
 
     # Default to server-side keys if client does not provide them.
@@ -45,48 +188,144 @@ async def websocket_endpoint(websocket: WebSocket):
     }
     
     session_persona = "me"  # default persona
-    
-    async def handle_transcript(text: str):
+    streaming = LLM_STREAMING
+    tts_concurrency = TTS_CONCURRENCY
+    audio_protocol = "json"  # legacy base64-in-JSON unless the client asks for binary frames
+    vad_threshold = STT_VAD_THRESHOLD
+    input_format = codec.INPUT_PCM  # raw Int16 mic frames unless the client asks for Opus/WebM
+    output_format = codec.OUTPUT_WAV  # Murf's WAV unless compressed speech is negotiated
+    output_bitrate = TTS_OUTPUT_BITRATE_KBPS
+    debug_timing = False  # send each turn's stage timings to the client
+    prefetcher = None  # starts news/web lookups from partial transcripts
+
+    async def flush_audio(turn_id: int):
+        # Tell the client to drop queued and late audio of the interrupted answer
+        await websocket.send_json({"type": "flush", "turn_id": turn_id})
+
+    turns = TurnManager(flush_audio)
+
+    async def play_fallback(turn_id: int, text: str, seq: int = 0):
+        # Fails fast without touching any upstream: canned line plus the pre-recorded clip
+        await websocket.send_json({"type": "llm_error", "text": text})
+        clip = fallback_audio()
+        if clip:
+            await AudioSink(websocket, audio_protocol, turn_id).send_clip(seq, clip)
+
+    async def handle_transcript(text: str, turn_id: int, cancel_event, trace: metrics.TurnTrace):
+        async def synthesize(sentence: str, emit):
+            started = time.perf_counter()
+            waiting = True
+
+            def speak(deliver) -> bytes:
+                def on_audio(chunk: bytes):
+                    nonlocal waiting
+                    if waiting:
+                        waiting = False
+                        trace.observe("tts_first_byte", time.perf_counter() - started)
+                    deliver(chunk)
+
+                return tts.speak(sentence, api_keys.get("murf"), on_chunk=on_audio, cancel_event=cancel_event)
+
+            def speak_compressed() -> bytes:
+                # Each Murf chunk is encoded as it arrives; only the last frame waits for the flush
+                with codec.StreamingEncoder(emit, output_format, output_bitrate) as encoder:
+                    audio = speak(encoder.feed)
+                if audio and not encoder.bytes_out:
+                    emit(audio)  # the encoder failed: send the clip uncompressed
+                return audio
+
+            if output_format == codec.OUTPUT_WAV:
+                return await run_blocking(speak, emit)
+            return await run_blocking(speak_compressed)
+
         await websocket.send_json({"type": "final", "text": text})
+        sink = AudioSink(websocket, audio_protocol, turn_id, on_first_audio=lambda: trace.mark("first_audio"))
+        speaker = SynthesisStage(synthesize, sink, tts_concurrency, tts_global_limit)
+        reply = None
+        metrics.active_turns.inc()
         try:
-            full_response, updated_history = "", chat_history
-            
-            if llm.should_fetch_news(text):
-                full_response, updated_history = llm.get_news_response(
-                    text, chat_history, api_key=api_keys.get("gemini"), news_api_key=api_keys.get("newsapi"), persona=session_persona
-                )
-            elif llm.should_search_web(text):
-                full_response, updated_history = llm.get_web_response(
-                    text, chat_history, gemini_api_key=api_keys.get("gemini"), serp_api_key=api_keys.get("serpapi"), persona=session_persona
-                )
-            else:
-                full_response, updated_history = llm.get_llm_response(
-                    text, chat_history, api_key=api_keys.get("gemini"), persona=session_persona
-                )
-            
-            chat_history.clear()
-            chat_history.extend(updated_history if updated_history else [])
+            splitter = SentenceSplitter()
+            chunks = asyncio.Queue()
+            streamed = ""
+
+            def on_chunk(piece: str):
+                loop.call_soon_threadsafe(chunks.put_nowait, piece)
+
+            reply = asyncio.create_task(generate_reply(
+                text, chat_history, api_keys, session_persona, session_id,
+                on_chunk=on_chunk if streaming else None, cancel_event=cancel_event, trace=trace
+            ))
+            reply.add_done_callback(lambda _: chunks.put_nowait(None))
+
+            # Start speaking each sentence as soon as it is complete
+            while (piece := await chunks.get()) is not None:
+                trace.mark("llm_first_token")
+                streamed += piece
+                await websocket.send_json({"type": "assistant_partial", "text": streamed})
+                for sentence in splitter.feed(piece):
+                    speaker.submit(sentence)
+
+            full_response, updated_history = await reply
+            trace.mark("llm_first_token")
+            trace.mark("llm_complete")
+            if not streamed:
+                # Quick replies, canned errors and non-streaming mode arrive in one piece
+                for sentence in splitter.feed(full_response):
+                    speaker.submit(sentence)
+
+            if updated_history is not chat_history:
+                chat_history.clear()
+                chat_history.extend(updated_history if updated_history else [])
 
             await websocket.send_json({"type": "assistant", "text": full_response})
 
-            sentences = re.split(r'(?<=[.?!])\s+', full_response.strip())
-            
-            for sentence in sentences:
-                if sentence.strip():
-                    audio_bytes = await loop.run_in_executor(
-                        None, tts.speak, sentence.strip(), api_keys.get("murf")
-                    )
-                    if audio_bytes:
-                        b64_audio = base64.b64encode(audio_bytes).decode('utf-8')
-                        await websocket.send_json({"type": "audio", "b64": b64_audio})
+            for sentence in splitter.flush():
+                speaker.submit(sentence)
+            await speaker.finish()
+            trace.mark("turn_total")
+            metrics.turns_total.inc(outcome="completed")
+            if debug_timing:
+                await websocket.send_json({"type": "timing", "turn_id": turn_id, "spans": trace.summary()})
 
+        except admission.AdmissionError as e:
+            # A provider is down or saturated: answer now instead of waiting on it
+            speaker.cancel()
+            metrics.turns_total.inc(outcome="unavailable")
+            logging.warning("Turn %d failed fast: %s", turn_id, e)
+            await play_fallback(turn_id, UPSTREAM_UNAVAILABLE_REPLY, speaker.submitted)
+            if debug_timing:
+                await websocket.send_json({"type": "timing", "turn_id": turn_id, "spans": trace.summary()})
+        except asyncio.CancelledError:
+            # Barge-in: a newer transcript replaced this turn
+            metrics.turns_total.inc(outcome="interrupted")
+            speaker.cancel()
+            if reply is not None:
+                reply.cancel()
+            raise
         except Exception as e:
+            speaker.cancel()
+            metrics.turns_total.inc(outcome="error")
             logging.exception(f"Error in LLM/TTS pipeline: {e}")
-            await websocket.send_json({"type": "llm_error", "text": "Sorry, I hit a snag while processing your request."})
+            await websocket.send_json({"type": "llm_error", "text": PIPELINE_ERROR_REPLY})
+            audio_bytes = tts.cached_speech(PIPELINE_ERROR_REPLY)
+            if audio_bytes:
+                await sink.send_clip(speaker.submitted, audio_bytes)
+        finally:
+            metrics.active_turns.dec()
 
     def on_final_transcript(text: str):
         logging.info(f"Final transcript received: {text}")
-        asyncio.run_coroutine_threadsafe(handle_transcript(text), loop)
+        trace = metrics.TurnTrace()
+        # How much audio AssemblyAI needed after the last word to call the turn over
+        if transcriber.last_word_end_ms is not None:
+            endpoint_ms = ingestor.audio_ms_sent - transcriber.last_word_end_ms
+            if endpoint_ms >= 0:
+                trace.observe("stt_endpoint", endpoint_ms / 1000)
+        if prefetcher:
+            prefetcher.resolve(text)
+        asyncio.run_coroutine_threadsafe(
+            turns.start(lambda turn_id, cancel_event: handle_transcript(text, turn_id, cancel_event, trace)), loop
+        )
 
     try:
         initial = await websocket.receive_text()
@@ -101,25 +340,104 @@ async def websocket_endpoint(websocket: WebSocket):
                 if v:
                     api_keys[k] = v
             session_persona = config.get("persona", session_persona)
+            streaming = bool(config.get("stream", streaming))
+            try:
+                tts_concurrency = min(int(config.get("tts_concurrency", tts_concurrency)), TTS_GLOBAL_CONCURRENCY)
+            except (TypeError, ValueError):
+                pass
+            if config.get("audio_protocol") in AUDIO_PROTOCOLS:
+                audio_protocol = config["audio_protocol"]
+            if config.get("input_format") == codec.INPUT_WEBM and codec.ffmpeg_available():
+                input_format = codec.INPUT_WEBM
+            requested_output = config.get("output_format", TTS_OUTPUT_FORMAT)
+            if requested_output in codec.OUTPUT_FORMATS and requested_output != codec.OUTPUT_WAV and codec.ffmpeg_available():
+                output_format = requested_output
+            try:
+                output_bitrate = min(
+                    max(int(config.get("output_bitrate", output_bitrate)), codec.MIN_BITRATE_KBPS), codec.MAX_BITRATE_KBPS
+                )
+            except (TypeError, ValueError):
+                pass
+            debug_timing = bool(config.get("debug_timing", False))
+            try:
+                vad_threshold = max(int(config.get("vad_threshold", vad_threshold)), 0)
+            except (TypeError, ValueError):
+                pass
+            # Resume the conversation the client's token names, or start a resumable one
+            session_token, resumed = None, False
             try:
-                llm.init_model(api_keys.get("gemini"), session_persona)
+                token = config.get("session_token")
+                if isinstance(token, str) and await run_blocking(sessions.store.resume, token, session_persona):
+                    session_token, resumed = token, True
+                else:
+                    session_token = await run_blocking(sessions.store.create, session_persona)
+                session_id = session_token
+            except Exception as e:
+                logging.warning("Session store unavailable; this session can't be resumed: %s", e)
+            await websocket.send_json({
+                "type": "config_ack", "audio_protocol": audio_protocol, "input_format": input_format,
+                "output_format": output_format, "output_bitrate": output_bitrate,
+                "session_token": session_token, "resumed": resumed,
+            })
+            try:
+                await run_blocking(llm.init_model, api_keys.get("gemini"), session_persona, session_id)
             except Exception as e:
                 logging.warning("Failed to init LLM model: %s", e)
 
-        transcriber = stt.AssemblyAIStreamingTranscriber(
-            on_final_callback=on_final_transcript, 
-            api_key=api_keys.get("assemblyai")
+        if SPECULATIVE_PREFETCH:
+            prefetcher = SpeculativePrefetcher(
+                loop, upstream_executor, api_keys, session_persona,
+                debounce=PREFETCH_DEBOUNCE_MS / 1000, min_words=PREFETCH_MIN_WORDS,
+            )
+
+        # A pre-connected session when the server key is used; connecting never blocks the loop
+        try:
+            transcriber = await run_blocking(
+                transcriber_pool.acquire, api_keys.get("assemblyai"),
+                on_final_callback=on_final_transcript,
+                on_partial_callback=prefetcher.on_partial if prefetcher else None,
+            )
+        except Exception as e:
+            logging.warning("Could not open an AssemblyAI session: %s", e)
+            await (await turns.start(lambda turn_id, _: play_fallback(turn_id, STT_UNAVAILABLE_REPLY)))
+            return
+        # Decouples the socket from AssemblyAI: receive never waits on the upstream send
+        ingestor = stt.AudioIngestor(
+            transcriber.stream_audio,
+            chunk_ms=STT_CHUNK_MS,
+            max_chunk_ms=STT_MAX_CHUNK_MS,
+            max_queue_frames=STT_QUEUE_FRAMES,
+            overflow_policy=STT_OVERFLOW_POLICY,
+            vad_threshold=vad_threshold,
+            vad_hangover_ms=STT_VAD_HANGOVER_MS,
+            vad_preroll_ms=STT_VAD_PREROLL_MS,
         )
 
+        # Compressed uploads are decoded to PCM before ingestion
+        decoder = codec.StreamingDecoder(ingestor.feed) if input_format == codec.INPUT_WEBM else None
+        feed = decoder.feed if decoder else ingestor.feed
+
         while True:
             data = await websocket.receive_bytes()
-            transcriber.stream_audio(data)
+            feed(data)
     except Exception as e:
         logging.info(f"WebSocket closed or error: {e}")
     finally:
+        turns.cancel()
+        if locals().get('decoder'):
+            await loop.run_in_executor(None, decoder.close)
+        if 'ingestor' in locals():
+            await loop.run_in_executor(None, ingestor.close)
+            logging.info("Audio ingestion stats: %s", ingestor.stats)
         if 'transcriber' in locals() and transcriber:
             try:
-                transcriber.close()
+                # Unused sessions go back to the pool; used ones are terminated off the loop
+                await run_blocking(transcriber_pool.release, transcriber, api_keys.get("assemblyai"))
             except Exception:
                 pass
+        if prefetcher:
+            prefetcher.close()
+            logging.info("Speculative prefetch stats: %s", prefetcher.stats)
+        llm.release_session(session_id)
+        metrics.active_sessions.dec()
         logging.info("Transcription resources released.")
@@ -0,0 +1,66 @@
+"""
+Concurrency check for the turn pipeline.
+
+Replaces the Gemini/SerpAPI/NewsAPI calls with fakes that block for a fixed
+time (like the real SDKs do) and runs N turns at once through
+``app.generate_reply``. With the upstream calls off the event loop, N
+sessions should finish in roughly the time of one.
+
+    python benchmarks/bench_concurrency.py --sessions 20 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import app  # noqa: E402
+from services import llm  # noqa: E402
+
+
+def _fake_upstream(latency: float):
+    def call(user_query, history, *args, **kwargs):
+        time.sleep(latency)
+        return f"reply to {user_query}", history
+    return call
+
+
+async def _run(sessions: int, queries):
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        app.generate_reply(queries[i % len(queries)], [], {}, "me") for i in range(sessions)
+    ])
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds each fake upstream call blocks")
+    parser.add_argument("--max-ratio", type=float, default=2.0, help="fail if N sessions take longer than this many single turns")
+    args = parser.parse_args()
+
+    fake = _fake_upstream(args.latency)
+    llm.get_llm_response = fake
+    llm.get_web_response = fake
+    llm.get_news_response = fake
+
+    queries = ["tell me a joke", "what's the weather today", "latest news please"]
+    single = asyncio.run(_run(1, queries))
+    many = asyncio.run(_run(args.sessions, queries))
+    ratio = many / single
+
+    print(f"1 session:  {single:.3f}s")
+    print(f"{args.sessions} sessions: {many:.3f}s  ({ratio:.2f}x a single turn)")
+    if ratio > args.max_ratio:
+        print("FAIL: concurrent turns are being serialized")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
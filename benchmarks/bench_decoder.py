@@ -0,0 +1,100 @@
+"""
+Throughput benchmark for the Opus/WebM mic decoder (services/codec.py).
+
+Encodes a synthetic speech-like clip to WebM/Opus at the browser's bitrate,
+then pushes it through N concurrent StreamingDecoders as fast as they take
+it. ffmpeg CPU time (children rusage) gives the decode cost per audio
+second, i.e. how many real-time streams one core sustains.
+
+    python benchmarks/bench_decoder.py --seconds 60 --streams 1 4 16
+
+Needs ffmpeg on PATH (or FFMPEG_BINARY).
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import FFMPEG_BINARY  # noqa: E402
+from services import codec  # noqa: E402
+
+SAMPLE_RATE = 16000
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+
+
+def make_clip(seconds: int, bitrate: int) -> bytes:
+    """A modulated tone plus noise, encoded like MediaRecorder would."""
+    source = f"sine=f=220:r=48000:d={seconds},volume='0.5+0.4*sin(2*PI*t)':eval=frame"
+    return subprocess.run(
+        [
+            FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", source,
+            "-f", "lavfi", "-i", f"anoisesrc=a=0.02:r=48000:d={seconds}",
+            "-filter_complex", "amix=inputs=2", "-ac", "1",
+            "-c:a", "libopus", "-b:a", str(bitrate), "-frame_duration", "20",
+            "-f", "webm", "pipe:1",
+        ],
+        check=True, capture_output=True,
+    ).stdout
+
+
+def run(clip: bytes, streams: int, slice_bytes: int) -> dict:
+    received = [0] * streams
+
+    def sink(i):
+        def on_pcm(chunk):
+            received[i] += len(chunk)
+        return on_pcm
+
+    cpu_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    decoders = [codec.StreamingDecoder(sink(i)) for i in range(streams)]
+    for offset in range(0, len(clip), slice_bytes):
+        piece = clip[offset:offset + slice_bytes]
+        for decoder in decoders:
+            decoder.feed(piece)
+    for decoder in decoders:
+        decoder.close(timeout=600)
+    wall = time.perf_counter() - start
+    cpu_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (cpu_after.ru_utime - cpu_before.ru_utime) + (cpu_after.ru_stime - cpu_before.ru_stime)
+
+    audio_seconds = sum(received) / BYTES_PER_SECOND
+    return {
+        "wall": wall,
+        "cpu": cpu,
+        "audio_seconds": audio_seconds,
+        "streams_per_core": audio_seconds / cpu if cpu else float("inf"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=int, default=60, help="clip length per stream")
+    parser.add_argument("--bitrate", type=int, default=24000, help="Opus bitrate (bits/s)")
+    parser.add_argument("--streams", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    if not codec.ffmpeg_available():
+        parser.exit(1, f"ffmpeg not found ({FFMPEG_BINARY}); set FFMPEG_BINARY\n")
+
+    clip = make_clip(args.seconds, args.bitrate)
+    # MediaRecorder timeslice of 100 ms at the given bitrate
+    slice_bytes = max(args.bitrate // 8 // 10, 1)
+    print(f"clip: {args.seconds}s, {len(clip) / 1024:.1f} KiB webm/opus "
+          f"({len(clip) * 8 / args.seconds / 1000:.1f} kbit/s vs {BYTES_PER_SECOND * 8 / 1000:.0f} kbit/s raw PCM)")
+
+    for streams in args.streams:
+        r = run(clip, streams, slice_bytes)
+        print(f"streams={streams:3d}  wall={r['wall']:6.2f}s  ffmpeg cpu={r['cpu']:6.2f}s  "
+              f"decoded={r['audio_seconds']:7.1f} audio-s  "
+              f"=> {r['streams_per_core']:6.0f} real-time streams per core")
+
+
+if __name__ == "__main__":
+    main()
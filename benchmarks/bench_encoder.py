@@ -0,0 +1,133 @@
+"""
+CPU and latency benchmark for the speech encoder (services/codec.py).
+
+Renders a synthetic speech-like 24 kHz WAV, then has N concurrent sessions
+each encode --sentences clips of it the way a reply is sent: one
+StreamingEncoder per sentence, fed Murf-sized chunks at --speed times real
+time (0: as fast as the encoder takes them). ffmpeg CPU time (children
+rusage) gives the encode cost per audio second, i.e. how many real-time
+speech streams one core sustains; the close time is what the end of each
+sentence waits for the encoder's last frame.
+
+    python benchmarks/bench_encoder.py --format opus mp3 --sessions 1 8 32
+
+Needs ffmpeg on PATH (or FFMPEG_BINARY).
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from config import FFMPEG_BINARY  # noqa: E402
+from services import codec  # noqa: E402
+
+SAMPLE_RATE = 24000
+BYTES_PER_SECOND = SAMPLE_RATE * 2
+CHUNK_BYTES = 4096  # what Murf's stream yields
+
+
+def make_sentence(seconds: float) -> bytes:
+    """A modulated tone plus noise as a 24 kHz mono 16-bit WAV, like Murf returns."""
+    source = f"sine=f=180:r={SAMPLE_RATE}:d={seconds},volume='0.5+0.4*sin(8*PI*t)':eval=frame"
+    return subprocess.run(
+        [
+            FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+            "-f", "lavfi", "-i", source,
+            "-f", "lavfi", "-i", f"anoisesrc=a=0.02:r={SAMPLE_RATE}:d={seconds}",
+            "-filter_complex", "amix=inputs=2", "-ac", "1", "-c:a", "pcm_s16le",
+            "-f", "wav", "pipe:1",
+        ],
+        check=True, capture_output=True,
+    ).stdout
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def run(sentence: bytes, output_format: str, bitrate: int, sessions: int, sentences: int, speed: float) -> dict:
+    first_output, close_seconds, bytes_out = [], [], []
+    lock = threading.Lock()
+    pace = CHUNK_BYTES / BYTES_PER_SECOND / speed if speed else 0
+
+    def session():
+        for _ in range(sentences):
+            started = time.perf_counter()
+            first = []
+
+            def on_data(chunk):
+                if not first:
+                    first.append(time.perf_counter() - started)
+
+            encoder = codec.StreamingEncoder(on_data, output_format, bitrate)
+            for offset in range(0, len(sentence), CHUNK_BYTES):
+                encoder.feed(sentence[offset:offset + CHUNK_BYTES])
+                if pace:
+                    time.sleep(pace)
+            closing = time.perf_counter()
+            encoder.close(timeout=600)
+            with lock:
+                close_seconds.append(time.perf_counter() - closing)
+                first_output.extend(first)
+                bytes_out.append(encoder.bytes_out)
+
+    cpu_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    start = time.perf_counter()
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    cpu_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (cpu_after.ru_utime - cpu_before.ru_utime) + (cpu_after.ru_stime - cpu_before.ru_stime)
+
+    audio_seconds = sessions * sentences * (len(sentence) - 44) / BYTES_PER_SECOND
+    return {
+        "wall": wall,
+        "cpu": cpu,
+        "ratio": len(sentence) * len(bytes_out) / max(sum(bytes_out), 1),
+        "streams_per_core": audio_seconds / cpu if cpu else float("inf"),
+        "first_output_p50": percentile(first_output, 50) if first_output else float("nan"),
+        "close_p50": percentile(close_seconds, 50),
+        "close_p95": percentile(close_seconds, 95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", nargs="+", default=[codec.OUTPUT_OPUS, codec.OUTPUT_MP3],
+                        choices=[codec.OUTPUT_OPUS, codec.OUTPUT_MP3])
+    parser.add_argument("--bitrate", type=int, default=32, help="kbit/s")
+    parser.add_argument("--sentence-seconds", type=float, default=4.0)
+    parser.add_argument("--sentences", type=int, default=5, help="sentences per session")
+    parser.add_argument("--speed", type=float, default=4.0, help="Murf delivery rate relative to real time")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 8, 32])
+    args = parser.parse_args()
+
+    if not codec.ffmpeg_available():
+        parser.exit(1, f"ffmpeg not found ({FFMPEG_BINARY}); set FFMPEG_BINARY\n")
+
+    sentence = make_sentence(args.sentence_seconds)
+    print(f"sentence: {args.sentence_seconds}s, {len(sentence) / 1024:.1f} KiB wav "
+          f"({BYTES_PER_SECOND * 8 / 1000:.0f} kbit/s) in {CHUNK_BYTES}-byte chunks at {args.speed}x real time")
+
+    for output_format in args.format:
+        for sessions in args.sessions:
+            r = run(sentence, output_format, args.bitrate, sessions, args.sentences, args.speed)
+            print(f"{output_format:<5} {args.bitrate}k sessions={sessions:3d}  wall={r['wall']:6.2f}s  "
+                  f"ffmpeg cpu={r['cpu']:6.2f}s  {r['ratio']:4.1f}x smaller  "
+                  f"first output p50={r['first_output_p50'] * 1000:5.1f}ms  "
+                  f"close p50/p95={r['close_p50'] * 1000:5.1f}/{r['close_p95'] * 1000:5.1f}ms  "
+                  f"=> {r['streams_per_core']:5.0f} real-time streams per core")
+
+
+if __name__ == "__main__":
+    main()
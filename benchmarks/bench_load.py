@@ -0,0 +1,223 @@
+"""
+Offline load test: hundreds of simulated voice clients against /ws.
+
+Starts the app in-process with every upstream provider replaced by the
+fakes in benchmarks/fakes.py, then opens --sessions WebSocket clients that
+each speak --turns utterances: real-time 16 kHz PCM "speech" (non-zero
+samples) followed by silence until the answer has finished. Reports
+time-to-first-audio (end of the user's speech -> first audio frame
+received) at p50/p95/p99, the server-side stage timings, and turns/sec.
+
+    python benchmarks/bench_load.py --sessions 200 --turns 3
+    python benchmarks/bench_load.py --serve --port 8765          # fakes-only server
+    python benchmarks/bench_load.py --url ws://127.0.0.1:8765/ws # drive it from another process
+
+Clients and server share one process (and GIL) unless --url is used.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import defaultdict
+
+import uvicorn
+import websockets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+# Clients use the server-side keys (the pooled, production path); the fakes
+# ignore their values. No background warm-ups competing with the run.
+for _var in ("ASSEMBLYAI_API_KEY", "GEMINI_API_KEY", "MURF_API_KEY", "SERPAPI_API_KEY", "NEWSAPI_API_KEY"):
+    os.environ.setdefault(_var, "fake")
+os.environ.setdefault("PROVIDER_WARMUP", "0")
+os.environ.setdefault("TTS_PREWARM", "0")
+
+import app  # noqa: E402
+from benchmarks import fakes  # noqa: E402
+
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = 4096  # what the browser's ScriptProcessor sends
+FRAME_SECONDS = FRAME_SAMPLES / SAMPLE_RATE
+SILENCE = bytes(FRAME_SAMPLES * 2)
+
+
+def speech_frame(rng: random.Random) -> bytes:
+    # Noise that never hits zero, so the fake transcriber hears "speech"
+    return struct.pack(f"<{FRAME_SAMPLES}h", *(rng.choice((-1, 1)) * rng.randint(800, 4000) for _ in range(FRAME_SAMPLES)))
+
+
+def percentile(values, pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+class Results:
+    def __init__(self):
+        self.ttfa = []
+        self.audio_bytes = []
+        self.turn_seconds = []
+        self.spans = defaultdict(list)
+        self.errors = 0
+        self.timeouts = 0
+        self.failed_sessions = 0
+
+
+async def run_session(url: str, args, frames, results: Results):
+    speech_frames = int(args.speech_seconds / FRAME_SECONDS) or 1
+    pace = FRAME_SECONDS / args.speed
+    try:
+        async with websockets.connect(url, max_size=None, open_timeout=args.turn_timeout) as ws:
+            await ws.send(json.dumps({
+                "type": "config", "keys": {}, "persona": "me", "stream": True,
+                "audio_protocol": "binary", "debug_timing": True,
+                "output_format": args.output_format, "output_bitrate": args.output_bitrate,
+            }))
+            for _ in range(args.turns):
+                for i in range(speech_frames):
+                    await ws.send(frames[i % len(frames)])
+                    await asyncio.sleep(pace)
+                speech_end = time.perf_counter()
+
+                async def keep_silent():
+                    while True:
+                        await ws.send(SILENCE)
+                        await asyncio.sleep(pace)
+
+                silence = asyncio.create_task(keep_silent())
+                first_audio = None
+                audio_bytes = 0
+                try:
+                    async with asyncio.timeout(args.turn_timeout):
+                        while True:
+                            message = await ws.recv()
+                            if isinstance(message, bytes):
+                                audio_bytes += len(message)
+                                if first_audio is None:
+                                    first_audio = time.perf_counter() - speech_end
+                                continue
+                            msg = json.loads(message)
+                            if msg["type"] == "llm_error":
+                                results.errors += 1
+                            elif msg["type"] == "timing":
+                                for stage, ms in msg["spans"].items():
+                                    results.spans[stage].append(ms / 1000)
+                                break
+                except TimeoutError:
+                    results.timeouts += 1
+                finally:
+                    silence.cancel()
+                if first_audio is not None:
+                    results.ttfa.append(first_audio)
+                    results.audio_bytes.append(audio_bytes)
+                results.turn_seconds.append(time.perf_counter() - speech_end)
+    except Exception as e:
+        results.failed_sessions += 1
+        print(f"session failed: {e!r}", file=sys.stderr)
+
+
+async def drive(url: str, args) -> Results:
+    rng = random.Random(1)
+    frames = [speech_frame(rng) for _ in range(4)]
+    results = Results()
+    sessions = []
+    for _ in range(args.sessions):
+        sessions.append(asyncio.create_task(run_session(url, args, frames, results)))
+        await asyncio.sleep(args.ramp / max(args.sessions, 1))
+    await asyncio.gather(*sessions)
+    return results
+
+
+def start_server(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app.app, host="127.0.0.1", port=port, log_level="warning", ws_max_size=1 << 24))
+    threading.Thread(target=server.run, name="uvicorn", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def report(results: Results, wall: float, args):
+    turns = len(results.turn_seconds)
+    print(f"sessions={args.sessions} turns/session={args.turns} speed={args.speed}x  wall={wall:.1f}s")
+    print(f"completed turns: {turns}  errors: {results.errors}  timeouts: {results.timeouts}  "
+          f"failed sessions: {results.failed_sessions}")
+    print(f"throughput: {turns / wall:.2f} turns/s")
+    if results.audio_bytes:
+        print(f"downstream audio ({args.output_format}): "
+              f"{sum(results.audio_bytes) / len(results.audio_bytes) / 1024:.1f} KiB/turn")
+    rows = [("ttfa (client)", results.ttfa)] + sorted(results.spans.items())
+    print(f"{'stage':<18}{'p50':>9}{'p95':>9}{'p99':>9}   (seconds)")
+    for name, values in rows:
+        print(f"{name:<18}{percentile(values, 50):9.3f}{percentile(values, 95):9.3f}{percentile(values, 99):9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=3, help="utterances per session")
+    parser.add_argument("--speech-seconds", type=float, default=1.5, help="length of each utterance")
+    parser.add_argument("--speed", type=float, default=1.0, help="audio send rate relative to real time")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which sessions connect")
+    parser.add_argument("--turn-timeout", type=float, default=30.0)
+    parser.add_argument("--url", help="drive an already running server instead of an in-process one")
+    parser.add_argument("--serve", action="store_true", help="only run the fakes-backed server")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--output-format", default="wav", help="speech format clients ask for: wav, mp3 or opus")
+    parser.add_argument("--output-bitrate", type=int, default=32, help="kbit/s for mp3/opus speech")
+    parser.add_argument("--tts-cache", action="store_true", help="keep the TTS audio cache enabled")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's per-session INFO logs")
+    for field, default in fakes.Profile._field_defaults.items():
+        parser.add_argument("--" + field.replace("_", "-"), type=type(default), default=default)
+    args = parser.parse_args()
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    url = args.url
+    if url is None:
+        profile = fakes.Profile(**{field: getattr(args, field) for field in fakes.Profile._fields})
+        fakes.install(profile, tts_cache=args.tts_cache)
+        port = args.port or free_port()
+        server = start_server(port)
+        url = f"ws://127.0.0.1:{port}/ws"
+        if args.serve:
+            print(f"serving fakes-backed app on {url} (Ctrl+C to stop)")
+            try:
+                threading.Event().wait()
+            except KeyboardInterrupt:
+                server.should_exit = True
+            return
+
+    start = time.perf_counter()
+    results = asyncio.run(drive(url, args))
+    report(results, time.perf_counter() - start, args)
+    if args.url is None:
+        prefetches = app.metrics.prefetches_total
+        print(f"speculative prefetches: {prefetches.value(outcome='hit'):.0f} hits, "
+              f"{prefetches.value(outcome='wasted'):.0f} wasted")
+        requests = app.metrics.cache_requests_total
+        for cache in ("news", "search"):
+            print(f"{cache} cache: {requests.value(cache=cache, outcome='hit'):.0f} hits, "
+                  f"{requests.value(cache=cache, outcome='miss'):.0f} misses, "
+                  f"{requests.value(cache=cache, outcome='coalesced'):.0f} coalesced")
+        summaries = app.llm.summary_cache_stats()
+        print(f"web/news answer cache: {summaries['hits']} hits, {summaries['misses']} misses "
+              f"({summaries['hit_rate']:.0%}), {summaries['gemini_calls_saved']} Gemini calls saved")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Routing benchmark and accuracy check.
+
+Runs the labelled corpus in benchmarks/routing_corpus.jsonl through the
+compiled router and through the previous substring scans
+(should_fetch_news, then should_search_web, with the quick-reply dict
+rebuilt per call), reporting accuracy and time per routed turn.
+
+    python benchmarks/bench_router.py --repeat 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from services import llm  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "routing_corpus.jsonl")
+
+
+def _legacy_route(text: str, persona: str = "me") -> str:
+    q = text.lower()
+    if any(k in q for k in ["news", "latest headlines", "what's happening", "current events"]):
+        return "news"
+    if any(k in q for k in ["weather", "temperature", "news", "latest", "today", "tomorrow",
+                            "who is", "what is", "population", "price", "time in", "score"]):
+        return "web"
+    quick_replies = {**llm.QUICK_REPLIES, **llm.PERSONA_QUICK_REPLIES.get(persona, {})}
+    if text.strip().lower() in quick_replies:
+        return "quick"
+    return "chat"
+
+
+def _current_route(text: str, persona: str = "me") -> str:
+    return llm.route(text, persona).intent
+
+
+def _evaluate(route, corpus):
+    wrong = [(c["text"], c["intent"], route(c["text"])) for c in corpus if route(c["text"]) != c["intent"]]
+    return 1 - len(wrong) / len(corpus), wrong
+
+
+def _time(route, corpus, repeat):
+    texts = [c["text"] for c in corpus]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            route(text)
+    return (time.perf_counter() - start) / (repeat * len(texts))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--min-accuracy", type=float, default=0.95)
+    args = parser.parse_args()
+
+    with open(CORPUS, encoding="utf-8") as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    for name, route in (("legacy", _legacy_route), ("router", _current_route)):
+        accuracy, wrong = _evaluate(route, corpus)
+        per_turn = _time(route, corpus, args.repeat)
+        print(f"{name:7}: accuracy {accuracy:6.1%} ({len(wrong)} wrong)  {per_turn * 1e6:6.2f} us/turn")
+        if name == "router":
+            for text, expected, got in wrong:
+                print(f"    {text!r}: expected {expected}, got {got}")
+            if accuracy < args.min_accuracy:
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Cold-start benchmark: how long `import app` takes and how long uvicorn
+needs to serve the first `/`, each measured in fresh interpreters.
+
+Also checks that no provider SDK (Gemini, AssemblyAI, Murf, SerpAPI) is
+loaded by the import itself -- they load on first use or via the warm-up
+hook. Exits non-zero when a budget is exceeded, so it can gate CI.
+
+    python benchmarks/bench_startup.py --runs 5 --max-import 1.5 --max-first-response 3
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROVIDER_SDKS = ("google.generativeai", "assemblyai", "murf", "serpapi")
+
+IMPORT_PROBE = f"""
+import json, sys, time
+started = time.perf_counter()
+import app
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {PROVIDER_SDKS!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(env) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", IMPORT_PROBE],
+        cwd=ROOT, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_first_response(env, timeout: float = 60.0) -> float:
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))  # never proxy localhost
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with opener.open(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.01)
+        raise TimeoutError(f"server did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import", type=float, help="fail if the median import time exceeds this (s)")
+    parser.add_argument("--max-first-response", type=float, help="fail if the median time to first / exceeds this (s)")
+    parser.add_argument("--no-warmup", action="store_true", help="disable the background provider warm-up")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.no_warmup:
+        env["PROVIDER_WARMUP"] = "0"
+
+    imports = [measure_import(env) for _ in range(args.runs)]
+    first = [measure_first_response(env) for _ in range(args.runs)]
+    import_median = statistics.median(r["seconds"] for r in imports)
+    first_median = statistics.median(first)
+    loaded = sorted({m for r in imports for m in r["loaded"]})
+
+    print(f"import app:        median {import_median:.3f}s  (min {min(r['seconds'] for r in imports):.3f}s)")
+    print(f"first / response:  median {first_median:.3f}s  (min {min(first):.3f}s)")
+    print(f"provider SDKs loaded by import: {', '.join(loaded) or 'none'}")
+
+    failed = bool(loaded)
+    if args.max_import is not None and import_median > args.max_import:
+        print(f"FAIL: import slower than {args.max_import}s")
+        failed = True
+    if args.max_first_response is not None and first_median > args.max_first_response:
+        print(f"FAIL: first response slower than {args.max_first_response}s")
+        failed = True
+    if loaded:
+        print("FAIL: provider SDKs must load lazily")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
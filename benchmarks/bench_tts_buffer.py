@@ -0,0 +1,88 @@
+"""
+Micro-benchmark for tts.speak on a long reply.
+
+Feeds a fake Murf stream (many small audio chunks, as the real streaming
+endpoint sends) through the previous implementation -- a fresh client per
+sentence, `audio_bytes += chunk` and re-opening the shared output file for
+every chunk -- and through the current tts.speak.
+
+    python benchmarks/bench_tts_buffer.py --seconds 30 --chunk 4096
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from services import tts  # noqa: E402
+
+SAMPLE_RATE = 24000  # Murf's default WAV output: 24 kHz, 16-bit mono
+
+
+class _FakeTextToSpeech:
+    def __init__(self, total_bytes: int, chunk_size: int):
+        self.chunk = b"\x01" * chunk_size
+        self.count = total_bytes // chunk_size
+
+    def stream(self, text, voice_id, style):
+        for _ in range(self.count):
+            yield self.chunk
+
+
+class _FakeMurf:
+    stream = None
+
+    def __init__(self, api_key=None, **kwargs):
+        self.text_to_speech = _FakeMurf.stream
+
+
+def _legacy_speak(text, api_key, file_path):
+    client = _FakeMurf(api_key=api_key)
+    open(file_path, "wb").close()
+    res = client.text_to_speech.stream(text=text, voice_id="en-IN-priya", style="Conversational")
+    audio_bytes = b""
+    for audio_chunk in res:
+        audio_bytes += audio_chunk
+        with open(file_path, "ab") as f:
+            f.write(audio_chunk)
+    return audio_bytes
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=30.0, help="length of the synthesized reply")
+    parser.add_argument("--chunk", type=int, default=4096, help="bytes per streamed chunk")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    total = int(args.seconds * SAMPLE_RATE * 2)
+    _FakeMurf.stream = _FakeTextToSpeech(total, args.chunk)
+    tts._get_client = lambda api_key: _FakeMurf(api_key=api_key)
+    tts.audio_cache.memory.max_size = 0  # measure synthesis, not cache hits
+    tts.audio_cache.disk_bytes = 0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = os.path.join(tmp, "stream_output.wav")
+        legacy = _time(lambda i: _legacy_speak(f"legacy {i}", "key", out), args.repeat)
+    current = _time(lambda i: tts.speak(f"current {i}", "key"), args.repeat)
+
+    mb = total / 1e6
+    print(f"reply: {args.seconds:.0f}s of audio, {mb:.1f} MB in {total // args.chunk} chunks")
+    print(f"legacy  : {legacy * 1000:8.1f} ms")
+    print(f"current : {current * 1000:8.1f} ms  ({legacy / current:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Local stand-ins for every upstream provider, for offline load tests.
+
+install(profile) swaps them in at the SDK boundary -- the AssemblyAI
+transcriber, the Gemini model, the Murf client, the NewsAPI session and
+the SerpAPI search call -- so everything above it (routing, chat registry,
+history window, caches, sentence pipeline, audio framing) runs for real.
+Latencies are wall-clock sleeps, like the blocking SDK calls they replace.
+
+The fake transcriber has no speech recognition: it treats non-zero PCM as
+speech and, after `stt_endpoint` seconds of trailing silence, finalizes the
+session's next utterance from TRANSCRIPTS.
+"""
+import itertools
+import math
+import struct
+import threading
+import time
+from typing import NamedTuple
+
+from services import llm, news, search, stt, tts
+
+TRANSCRIPTS = (
+    "tell me something interesting about octopuses",
+    "what's the weather in Mumbai today",
+    "give me the latest tech news",
+    "how do I make a good cup of coffee",
+    "who won the football match yesterday",
+    "explain black holes like I'm five",
+)
+
+REPLY = (
+    "Here's the short version. It's a lot more fun than it sounds, honestly! "
+    "Ask me again tomorrow and I'll have an even better answer."
+)
+
+TAIL_SILENCE_BYTES = 64  # a chunk ending in this many zero bytes counts as silence
+
+TTS_SAMPLE_RATE = 24000
+
+
+def wav_header(sample_rate: int = TTS_SAMPLE_RATE) -> bytes:
+    """44-byte mono 16-bit WAV header with an open-ended data size, like Murf's stream."""
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI", b"RIFF", 0xFFFFFFFF, b"WAVE", b"fmt ", 16, 1, 1,
+        sample_rate, sample_rate * 2, 2, 16, b"data", 0xFFFFFFFF,
+    )
+
+
+def _voiced_pcm(seconds: float = 1.0, sample_rate: int = TTS_SAMPLE_RATE) -> bytes:
+    # A pitch with harmonics under a syllable-rate envelope: compresses like speech, unlike b"\x01" * n
+    samples = []
+    for i in range(int(seconds * sample_rate)):
+        t = i / sample_rate
+        envelope = 0.5 + 0.5 * math.sin(2 * math.pi * 4 * t)
+        tone = sum(math.sin(2 * math.pi * 140 * h * t) / h for h in (1, 2, 3, 5))
+        samples.append(int(6000 * envelope * tone))
+    return struct.pack(f"<{len(samples)}h", *samples)
+
+
+VOICED_PCM = _voiced_pcm()
+_VOICED_LOOP = VOICED_PCM * 2  # any chunk up to len(VOICED_PCM) is a plain slice
+
+
+class Profile(NamedTuple):
+    """Latencies in seconds and streaming shape of the fake providers."""
+    stt_connect: float = 0.3
+    stt_endpoint: float = 0.5
+    llm_first_token: float = 0.4
+    llm_token_interval: float = 0.02
+    tts_first_byte: float = 0.25
+    tts_chunk_interval: float = 0.01
+    tts_chunk_bytes: int = 4096
+    tts_bytes_per_char: int = 3200  # ~24 kHz 16-bit speech at ~15 chars/s
+    search_latency: float = 0.6
+    news_latency: float = 0.4
+
+
+# ---------------- ASSEMBLYAI ----------------
+class FakeTranscriber:
+    profile = Profile()
+
+    def __init__(self, sample_rate: int = 16000, on_partial_callback=None, on_final_callback=None, api_key=None):
+        time.sleep(self.profile.stt_connect)
+        self.bytes_per_ms = sample_rate * 2 // 1000
+        self.on_partial_callback = on_partial_callback
+        self.on_final_callback = on_final_callback
+        self.last_word_end_ms = None
+        self.used = False
+        self.healthy = True
+        self._transcripts = itertools.cycle(TRANSCRIPTS)
+        self._next_text = next(self._transcripts)
+        self._audio_bytes = 0
+        self._speech_bytes = 0
+        self._pending = None
+        self._lock = threading.Lock()
+
+    def stream_audio(self, audio_chunk: bytes):
+        partial = None
+        self.used = True
+        with self._lock:
+            self._audio_bytes += len(audio_chunk)
+            silent = not any(audio_chunk[-TAIL_SILENCE_BYTES:])
+            if not silent:
+                self._speech_bytes += len(audio_chunk)
+                if self._pending is not None:
+                    self._pending.cancel()
+                    self._pending = None
+                # Reveal the utterance a word per ~300 ms of speech
+                words = self._next_text.split()
+                partial = " ".join(words[:max(1, self._speech_bytes // (300 * self.bytes_per_ms))])
+            elif self._speech_bytes and self._pending is None:
+                self.last_word_end_ms = self._audio_bytes // self.bytes_per_ms
+                self._pending = threading.Timer(self.profile.stt_endpoint, self._finalize)
+                self._pending.daemon = True
+                self._pending.start()
+        if partial and self.on_partial_callback:
+            self.on_partial_callback(partial)
+
+    def _finalize(self):
+        with self._lock:
+            self._pending = None
+            self._speech_bytes = 0
+            text = self._next_text
+            self._next_text = next(self._transcripts)
+        if self.on_final_callback:
+            self.on_final_callback(text)
+
+    def keep_alive(self):
+        pass
+
+    def close(self):
+        self.healthy = False
+        with self._lock:
+            if self._pending is not None:
+                self._pending.cancel()
+
+
+# ---------------- GEMINI ----------------
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _StreamedResponse:
+    def __init__(self, profile: Profile, pieces):
+        self._profile = profile
+        self._pieces = pieces
+
+    def __iter__(self):
+        profile = self._profile
+        time.sleep(profile.llm_first_token)
+        for i, piece in enumerate(self._pieces):
+            if i:
+                time.sleep(profile.llm_token_interval)
+            yield _Chunk(piece)
+
+
+def _reply(profile: Profile, stream: bool):
+    if stream:
+        return _StreamedResponse(profile, [word + " " for word in REPLY.split()])
+    time.sleep(profile.llm_first_token + profile.llm_token_interval * len(REPLY.split()))
+    return _Chunk(REPLY)
+
+
+class FakeChatSession:
+    def __init__(self, profile: Profile, history=None):
+        self.profile = profile
+        self.history = list(history or [])
+
+    @property
+    def last(self):
+        return self.history[-1] if self.history else None
+
+    def send_message(self, content, stream: bool = False, request_options=None):
+        self.history.append({"role": "user", "parts": [content]})
+        self.history.append({"role": "model", "parts": [REPLY]})
+        return _reply(self.profile, stream)
+
+    def rewind(self):
+        del self.history[-2:]
+
+
+class FakeGenerativeModel:
+    def __init__(self, profile: Profile):
+        self.profile = profile
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self.profile, history)
+
+    def generate_content(self, contents, stream: bool = False, request_options=None):
+        return _reply(self.profile, stream)
+
+
+# ---------------- MURF ----------------
+class _FakeTextToSpeech:
+    def __init__(self, profile: Profile):
+        self.profile = profile
+
+    def stream(self, text: str, voice_id: str = None, style: str = None):
+        profile = self.profile
+        remaining = max(len(text), 1) * profile.tts_bytes_per_char
+        time.sleep(profile.tts_first_byte)
+        header = wav_header()
+        offset = 0
+        while remaining > 0:
+            size = min(profile.tts_chunk_bytes, remaining)
+            remaining -= size
+            chunk = _VOICED_LOOP[offset:offset + size]
+            offset = (offset + size) % len(VOICED_PCM)
+            yield header + chunk if header else chunk
+            header = b""
+            time.sleep(profile.tts_chunk_interval)
+
+
+class FakeMurf:
+    def __init__(self, profile: Profile):
+        self.text_to_speech = _FakeTextToSpeech(profile)
+
+
+class NoAudioCache:
+    """Disables the TTS cache so every sentence costs a (fake) Murf call."""
+    hits = misses = 0
+
+    def get(self, *args):
+        return None
+
+    def put(self, *args):
+        pass
+
+
+# ---------------- NEWSAPI / SERPAPI ----------------
+class _FakeNewsResponse:
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"status": "ok", "articles": [
+            {"title": f"Headline {i}", "description": "Something happened.", "source": {"name": "Fake Wire"}}
+            for i in range(1, 6)
+        ]}
+
+
+class FakeNewsSession:
+    def __init__(self, profile: Profile):
+        self.profile = profile
+
+    def get(self, url, params=None, timeout=None):
+        time.sleep(self.profile.news_latency)
+        return _FakeNewsResponse()
+
+
+class FakeGoogleSearch:
+    def __init__(self, profile: Profile):
+        self.profile = profile
+
+    def __call__(self, params):
+        time.sleep(self.profile.search_latency)
+        return {"organic_results": [{"snippet": f"Result {i} for {params['q']}."} for i in range(1, 6)]}
+
+
+# ---------------- INSTALL ----------------
+def install(profile: Profile = Profile(), tts_cache: bool = False):
+    """Swaps every upstream provider for its fake (process-wide)."""
+    stt.AssemblyAIStreamingTranscriber = type("FakeTranscriber", (FakeTranscriber,), {"profile": profile})
+    search._google_search = FakeGoogleSearch(profile)
+    news._session = FakeNewsSession(profile)
+    llm._get_model = lambda api_key, persona: FakeGenerativeModel(profile)
+    tts._get_client = lambda api_key: FakeMurf(profile)
+    if not tts_cache:
+        tts.audio_cache = NoAudioCache()
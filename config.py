@@ -1,9 +1,6 @@
 # config.py
 import os
 from dotenv import load_dotenv
-import logging
-import google.generativeai as genai
-import assemblyai as aai
 
 load_dotenv()
 
@@ -13,13 +10,129 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 SERPAPI_API_KEY = os.getenv("SERPAPI_API_KEY")
 NEWSAPI_API_KEY = os.getenv("NEWSAPI_API_KEY")
 
-if ASSEMBLYAI_API_KEY:
-    try:
-        aai.settings.api_key = ASSEMBLYAI_API_KEY
-    except Exception:
-        logging.warning("Could not configure AssemblyAI")
-if GEMINI_API_KEY:
-    try:
-        genai.configure(api_key=GEMINI_API_KEY)
-    except Exception:
-        logging.warning("Could not configure Gemini")
+# Size of the dedicated thread pool that runs blocking upstream SDK calls
+# (Gemini, SerpAPI, NewsAPI, Murf) off the event loop.
+UPSTREAM_WORKERS = int(os.getenv("UPSTREAM_WORKERS", "32"))
+
+# Per-session Gemini chats: idle expiry, LRU session cap and a cap on the
+# total number of history messages kept in memory across all sessions.
+CHAT_IDLE_TTL_SECONDS = float(os.getenv("CHAT_IDLE_TTL_SECONDS", "1800"))
+CHAT_MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "500"))
+CHAT_MAX_HISTORY_MESSAGES = int(os.getenv("CHAT_MAX_HISTORY_MESSAGES", "20000"))
+
+# Resumable sessions (services/sessions.py): where their turns are kept --
+# "memory" (this process only) or "sqlite:///relative/path.db" /
+# "sqlite:////absolute/path.db" (shared by the workers on a host) -- how long
+# an idle session can still be resumed, and how many of its last turns are
+# kept to rebuild its chat.
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", str(24 * 3600)))
+SESSION_RESUME_TURNS = int(os.getenv("SESSION_RESUME_TURNS", "20"))
+
+# Conversation memory per session: the last HISTORY_KEEP_TURNS turns are kept
+# verbatim within HISTORY_TOKEN_BUDGET; older turns fold into a rolling summary.
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", "6"))
+HISTORY_SUMMARY_CHARS = int(os.getenv("HISTORY_SUMMARY_CHARS", "1200"))
+
+# Stream Gemini replies token by token into sentence-level TTS (clients may
+# override per session with "stream" in the config message).
+LLM_STREAMING = os.getenv("LLM_STREAMING", "1") == "1"
+
+# Sentences synthesized in parallel per session (clients may lower or raise
+# it with "tts_concurrency", capped by the global limit) and across the process.
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "3"))
+TTS_GLOBAL_CONCURRENCY = int(os.getenv("TTS_GLOBAL_CONCURRENCY", "32"))
+
+# Content-addressed cache of synthesized speech: in-memory LRU plus an on-disk
+# tier, both bounded in bytes. Canned lines are pre-synthesized at startup.
+TTS_CACHE_MEMORY_BYTES = int(os.getenv("TTS_CACHE_MEMORY_BYTES", str(32 * 1024 * 1024)))
+TTS_CACHE_DISK_BYTES = int(os.getenv("TTS_CACHE_DISK_BYTES", str(256 * 1024 * 1024)))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "uploads", "tts_cache"))
+TTS_PREWARM = os.getenv("TTS_PREWARM", "1") == "1"
+
+# Pooled Murf HTTP connections: request timeout (also the deadline for a
+# whole sentence's audio stream) and how long idle keep-alive connections
+# are held open.
+TTS_TIMEOUT_SECONDS = float(os.getenv("TTS_TIMEOUT_SECONDS", "30"))
+TTS_KEEPALIVE_SECONDS = float(os.getenv("TTS_KEEPALIVE_SECONDS", "60"))
+
+# NewsAPI responses are cached per normalized request for this long.
+NEWS_CACHE_TTL_SECONDS = float(os.getenv("NEWS_CACHE_TTL_SECONDS", "300"))
+NEWS_CACHE_MAX_ENTRIES = int(os.getenv("NEWS_CACHE_MAX_ENTRIES", "256"))
+
+# Web search snippets are cached per normalized query (TTLs per query
+# category live in services/search.py).
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "2048"))
+
+# Gemini answers to web/news questions are generated statelessly from the
+# fetched context and cached per (persona, question, context) for as long as
+# that context stays fresh.
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "1024"))
+
+# Optional JSON file replacing the built-in intent routing rules
+# (see services/router.py for the format).
+ROUTING_RULES_FILE = os.getenv("ROUTING_RULES_FILE")
+
+# Speculative news/web fetches from partial transcripts: a partial that asks
+# for news or web data starts its lookup once it has held for
+# PREFETCH_DEBOUNCE_MS (and has at least PREFETCH_MIN_WORDS words). The
+# debounce has to outlast the gap between spoken words, or every prefix of
+# the question ("what's the weather") is fetched and thrown away.
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "1") == "1"
+PREFETCH_DEBOUNCE_MS = int(os.getenv("PREFETCH_DEBOUNCE_MS", "700"))
+PREFETCH_MIN_WORDS = int(os.getenv("PREFETCH_MIN_WORDS", "2"))
+
+# Mic audio ingestion towards AssemblyAI: frames are coalesced into
+# STT_CHUNK_MS chunks (up to STT_MAX_CHUNK_MS when catching up) and at most
+# STT_QUEUE_FRAMES wait per session; the overflow policy is drop_oldest or drop_newest.
+STT_CHUNK_MS = int(os.getenv("STT_CHUNK_MS", "100"))
+STT_MAX_CHUNK_MS = int(os.getenv("STT_MAX_CHUNK_MS", "1000"))
+STT_QUEUE_FRAMES = int(os.getenv("STT_QUEUE_FRAMES", "32"))
+STT_OVERFLOW_POLICY = os.getenv("STT_OVERFLOW_POLICY", "drop_oldest")
+# Energy VAD (RMS of 16-bit PCM); 0 disables it. The hangover keeps trailing
+# silence flowing long enough for AssemblyAI to detect the end of a turn.
+STT_VAD_THRESHOLD = int(os.getenv("STT_VAD_THRESHOLD", "0"))
+STT_VAD_HANGOVER_MS = int(os.getenv("STT_VAD_HANGOVER_MS", "1500"))
+STT_VAD_PREROLL_MS = int(os.getenv("STT_VAD_PREROLL_MS", "300"))
+
+# Pre-connected AssemblyAI sessions kept ready for the server-side key
+# (0 disables the pool); idle ones are replaced after STT_POOL_IDLE_SECONDS.
+STT_POOL_SIZE = int(os.getenv("STT_POOL_SIZE", "2"))
+STT_POOL_IDLE_SECONDS = float(os.getenv("STT_POOL_IDLE_SECONDS", "120"))
+
+# Upstream admission control (services/admission.py): a call that can't get
+# its rate-limit tokens and concurrency slots within ADMISSION_WAIT_SECONDS
+# is refused. A provider/key's circuit breaker opens after BREAKER_FAILURES
+# consecutive failures and lets a probe through after BREAKER_RESET_SECONDS.
+# ADMISSION_LIMITS is JSON overriding per-provider limits, e.g.
+# {"gemini": {"key_concurrency": 4, "key_rate": 1}}.
+ADMISSION_WAIT_SECONDS = float(os.getenv("ADMISSION_WAIT_SECONDS", "1.0"))
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30"))
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS")
+
+# Per-stage deadlines for upstream calls (Murf uses TTS_TIMEOUT_SECONDS):
+# the AssemblyAI handshake (per attempt), NewsAPI/SerpAPI lookups, and a
+# whole Gemini reply.
+STT_CONNECT_TIMEOUT_SECONDS = float(os.getenv("STT_CONNECT_TIMEOUT_SECONDS", "2"))
+FETCH_TIMEOUT_SECONDS = float(os.getenv("FETCH_TIMEOUT_SECONDS", "8"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+# ffmpeg decodes Opus/WebM mic uploads; without it clients fall back to raw PCM.
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+# Speech sent back to clients: the default format for clients that don't
+# negotiate one ("wav" = Murf's audio as-is, "mp3" or "opus"), and the
+# bitrate compressed speech is encoded at (clients may ask for 8-128 kbit/s).
+TTS_OUTPUT_FORMAT = os.getenv("TTS_OUTPUT_FORMAT", "wav")
+TTS_OUTPUT_BITRATE_KBPS = int(os.getenv("TTS_OUTPUT_BITRATE_KBPS", "32"))
+# When a sentence ends, its encoder is given this long without producing any
+# output before ffmpeg is killed (which loses the sentence's last audio). A
+# flush that keeps producing output is never cut short, however slow.
+ENCODER_CLOSE_TIMEOUT_SECONDS = float(os.getenv("ENCODER_CLOSE_TIMEOUT_SECONDS", "5"))
+
+# Provider SDKs load lazily on first use; when set, the ones with a server-side
+# key are loaded in the background right after startup instead.
+PROVIDER_WARMUP = os.getenv("PROVIDER_WARMUP", "1") == "1"
+
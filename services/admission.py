@@ -0,0 +1,303 @@
+# services/admission.py
+"""
+Admission control for upstream provider calls.
+
+Every blocking call to AssemblyAI, Gemini, Murf, SerpAPI or NewsAPI runs
+inside admit(provider, api_key), which enforces per provider and per API key:
+
+  - a concurrency cap (calls in flight),
+  - a token bucket (sustained calls/s plus a burst allowance),
+  - a circuit breaker: after BREAKER_FAILURES consecutive failed calls the
+    key's breaker opens and calls are refused at once; after
+    BREAKER_RESET_SECONDS a single probe is let through, and its outcome
+    closes the breaker or opens it again.
+
+A call that can't get its tokens and slots within ADMISSION_WAIT_SECONDS is
+refused instead of queueing behind a slow provider. Refusals raise
+AdmissionError (CircuitOpenError for an open breaker); the services let it
+propagate so the turn can fail fast to a canned reply. How long an admitted
+call may run is a per-stage deadline the caller hands to its SDK.
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from services import metrics
+from config import (
+    ADMISSION_WAIT_SECONDS, ADMISSION_LIMITS, BREAKER_FAILURES, BREAKER_RESET_SECONDS, TTS_GLOBAL_CONCURRENCY,
+)
+
+logger = logging.getLogger(__name__)
+
+REASON_CIRCUIT_OPEN = "circuit_open"
+REASON_RATE_LIMITED = "rate_limited"
+REASON_OVERLOADED = "overloaded"
+
+
+class AdmissionError(RuntimeError):
+    """An upstream call was refused before it was made."""
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(f"{provider} call refused ({reason})")
+        self.provider = provider
+        self.reason = reason
+
+
+class CircuitOpenError(AdmissionError):
+    """The provider (for this API key) is failing; calls are refused until a probe succeeds."""
+
+
+class Limits(NamedTuple):
+    """Admission limits of one provider; 0 disables a cap or rate."""
+    concurrency: int = 0      # calls in flight, all keys
+    key_concurrency: int = 0  # calls in flight per API key
+    rate: float = 0           # sustained calls/s, all keys
+    burst: int = 1
+    key_rate: float = 0       # sustained calls/s per API key
+    key_burst: int = 1
+
+
+# Sized to protect the server (and a shared server-side key) rather than to
+# match any provider's quota; ADMISSION_LIMITS overrides individual fields.
+DEFAULT_LIMITS: Dict[str, Limits] = {
+    "assemblyai": Limits(concurrency=32, key_concurrency=32, rate=20, burst=40, key_rate=20, key_burst=40),
+    "gemini": Limits(concurrency=64, key_concurrency=64, rate=50, burst=100, key_rate=50, key_burst=100),
+    "murf": Limits(
+        concurrency=TTS_GLOBAL_CONCURRENCY, key_concurrency=TTS_GLOBAL_CONCURRENCY,
+        rate=100, burst=200, key_rate=100, key_burst=200,
+    ),
+    "serpapi": Limits(concurrency=16, key_concurrency=16, rate=10, burst=20, key_rate=10, key_burst=20),
+    "newsapi": Limits(concurrency=16, key_concurrency=16, rate=10, burst=20, key_rate=10, key_burst=20),
+}
+
+
+class TokenBucket:
+    """`rate` tokens per second, holding at most `burst`. Thread-safe."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """
+        Takes a token and returns how long to wait before using it, or None
+        (taking nothing) if that would be longer than max_wait. Waiting
+        callers queue up behind each other in reservation order.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+    def refund(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1)
+
+
+class CircuitBreaker:
+    """Closed -> open after `failures` consecutive failures -> half-open (one probe) after `reset_seconds`."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failures: int, reset_seconds: float):
+        self.name = name
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are refused outright (open and not yet due for a probe)."""
+        return self.state == self.OPEN and time.monotonic() - self._opened_at < self.reset_seconds
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self._consecutive = 0
+            if self.state == self.CLOSED:
+                return
+            self.state = self.CLOSED
+            self._probing = False
+        metrics.circuit_breakers_open.dec(provider=self.name)
+        logger.info("Circuit for %s closed again.", self.name)
+
+    def failure(self):
+        with self._lock:
+            self._consecutive += 1
+            if self.state == self.CLOSED and self._consecutive < self.failures:
+                return
+            was_closed = self.state == self.CLOSED
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+        if was_closed:
+            metrics.circuit_breakers_open.inc(provider=self.name)
+            logger.warning("Circuit for %s opened after %d consecutive failures.", self.name, self._consecutive)
+
+
+class _Gate:
+    """Concurrency slots and rate limit of one provider, or of one key of it."""
+
+    def __init__(self, concurrency: int, rate: float, burst: int):
+        self.slots = threading.BoundedSemaphore(concurrency) if concurrency > 0 else None
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+
+
+class _Provider:
+    def __init__(self, name: str, limits: Limits, failures: int, reset_seconds: float):
+        self.name = name
+        self.limits = limits
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.gate = _Gate(limits.concurrency, limits.rate, limits.burst)
+        self._keys: Dict[str, _Gate] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def for_key(self, api_key: str):
+        """(gate, breaker) of one API key, created on first use."""
+        with self._lock:
+            gate = self._keys.get(api_key)
+            if gate is None:
+                gate = self._keys[api_key] = _Gate(
+                    self.limits.key_concurrency, self.limits.key_rate, self.limits.key_burst
+                )
+                self._breakers[api_key] = CircuitBreaker(self.name, self.failures, self.reset_seconds)
+            return gate, self._breakers[api_key]
+
+    def breaker(self, api_key: str) -> Optional[CircuitBreaker]:
+        return self._breakers.get(api_key)
+
+
+class AdmissionController:
+    """Holds the limits, gates and breakers of every provider."""
+
+    def __init__(
+        self,
+        limits: Dict[str, Limits] = DEFAULT_LIMITS,
+        max_wait: float = ADMISSION_WAIT_SECONDS,
+        failures: int = BREAKER_FAILURES,
+        reset_seconds: float = BREAKER_RESET_SECONDS,
+    ):
+        self.max_wait = max_wait
+        self._providers = {
+            name: _Provider(name, provider_limits, failures, reset_seconds)
+            for name, provider_limits in limits.items()
+        }
+
+    def circuit_open(self, provider: str, api_key: Optional[str]) -> bool:
+        """True if calls to provider with this key would be refused by its breaker right now."""
+        breaker = self._providers[provider].breaker(api_key or "")
+        return breaker is not None and breaker.is_open
+
+    @contextmanager
+    def admit(self, provider: str, api_key: Optional[str]) -> Iterator[None]:
+        """
+        Waits (up to max_wait) for the provider's and the key's rate-limit
+        tokens and concurrency slots, then runs the body as one upstream
+        call. An exception from the body counts as a failure for the key's
+        circuit breaker. Raises AdmissionError if the call is refused.
+        """
+        state = self._providers[provider]
+        gate, breaker = state.for_key(api_key or "")
+        if breaker.is_open:
+            self.refuse(provider, REASON_CIRCUIT_OPEN)
+
+        deadline = time.monotonic() + self.max_wait
+        gates = (state.gate, gate)
+        reserved: List[TokenBucket] = []
+        wait = 0.0
+        for bucket in (g.bucket for g in gates if g.bucket is not None):
+            bucket_wait = bucket.reserve(self.max_wait)
+            if bucket_wait is None:
+                for taken in reserved:
+                    taken.refund()
+                self.refuse(provider, REASON_RATE_LIMITED)
+            reserved.append(bucket)
+            wait = max(wait, bucket_wait)
+        if wait:
+            time.sleep(wait)
+
+        held: List[threading.BoundedSemaphore] = []
+        try:
+            try:
+                for slots in (g.slots for g in gates if g.slots is not None):
+                    if not slots.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                        self.refuse(provider, REASON_OVERLOADED)
+                    held.append(slots)
+                if not breaker.allow():
+                    self.refuse(provider, REASON_CIRCUIT_OPEN)
+            except AdmissionError:
+                # The call never happens: give back the rate budget it reserved
+                for taken in reserved:
+                    taken.refund()
+                raise
+            try:
+                yield
+            except Exception:
+                breaker.failure()
+                raise
+            breaker.success()
+        finally:
+            for slots in held:
+                slots.release()
+
+    @staticmethod
+    def refuse(provider: str, reason: str):
+        """Counts a refused call in voice_admission_rejections_total and raises its AdmissionError."""
+        metrics.admission_rejections_total.inc(provider=provider, reason=reason)
+        if reason == REASON_CIRCUIT_OPEN:
+            raise CircuitOpenError(provider, reason)
+        raise AdmissionError(provider, reason)
+
+
+def _load_limits() -> Dict[str, Limits]:
+    limits = dict(DEFAULT_LIMITS)
+    if ADMISSION_LIMITS:
+        for name, overrides in json.loads(ADMISSION_LIMITS).items():
+            limits[name] = limits.get(name, Limits())._replace(**overrides)
+    return limits
+
+
+controller = AdmissionController(_load_limits())
+
+
+def admit(provider: str, api_key: Optional[str]):
+    """controller.admit(): use as `with admission.admit("gemini", api_key): ...`."""
+    return controller.admit(provider, api_key)
+
+
+def circuit_open(provider: str, api_key: Optional[str]) -> bool:
+    return controller.circuit_open(provider, api_key)
+
+
+def refuse(provider: str, reason: str):
+    """controller.refuse(): for callers that turn a call away before trying it."""
+    controller.refuse(provider, reason)
@@ -0,0 +1,263 @@
+# services/codec.py
+"""
+Streaming audio transcoding through ffmpeg subprocesses: mic uploads are
+decoded to PCM, synthesized speech is compressed for the trip back.
+
+ffmpeg is optional: when the binary is missing, callers negotiate raw PCM
+uploads and uncompressed WAV speech instead (see ffmpeg_available()).
+"""
+import logging
+import queue
+import shutil
+import struct
+import subprocess
+import threading
+from typing import Callable, List, Optional, Tuple
+
+from services import metrics
+from config import FFMPEG_BINARY, ENCODER_CLOSE_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Mic upload formats a client may negotiate in its config message
+INPUT_PCM = "pcm"    # raw 16 kHz mono Int16 (ScriptProcessor)
+INPUT_WEBM = "webm"  # Opus in WebM (MediaRecorder)
+INPUT_FORMATS = (INPUT_PCM, INPUT_WEBM)
+
+READ_SIZE = 3200  # 100 ms of 16 kHz Int16 per read
+
+# Speech formats a client may negotiate for the audio sent back to it
+OUTPUT_WAV = "wav"    # Murf's WAV as-is (uncompressed)
+OUTPUT_MP3 = "mp3"
+OUTPUT_OPUS = "opus"  # Opus in Ogg
+OUTPUT_FORMATS = (OUTPUT_WAV, OUTPUT_MP3, OUTPUT_OPUS)
+
+MIN_BITRATE_KBPS, MAX_BITRATE_KBPS = 8, 128
+ENCODE_SAMPLE_RATE = 24000  # plenty for speech, and a native Opus rate
+ENCODED_READ_SIZE = 4096
+_ENCODER_ARGS = {
+    OUTPUT_MP3: ["-c:a", "libmp3lame", "-f", "mp3"],
+    # Short Ogg pages so encoded audio leaves ffmpeg every ~100 ms, not every second. Complexity 5
+    # (of 10) roughly halves the encoder's CPU; for speech at these bitrates the difference is inaudible.
+    OUTPUT_OPUS: [
+        "-c:a", "libopus", "-application", "voip", "-compression_level", "5",
+        "-frame_duration", "20", "-page_duration", "100000", "-f", "ogg",
+    ],
+}
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which(FFMPEG_BINARY) is not None
+
+
+class StreamingDecoder:
+    """
+    Decodes a WebM/Opus byte stream into 16-bit mono PCM as it arrives.
+
+    feed() never blocks: container bytes are queued for a writer thread that
+    pipes them into ffmpeg, and a reader thread hands decoded PCM to on_pcm
+    (called from that thread). Nothing is dropped here -- losing container
+    bytes would corrupt the stream -- backpressure is applied downstream on
+    the PCM (see stt.AudioIngestor).
+    """
+
+    def __init__(self, on_pcm: Callable[[bytes], None], input_format: str = INPUT_WEBM, sample_rate: int = 16000):
+        self._on_pcm = on_pcm
+        self._proc = subprocess.Popen(
+            [
+                FFMPEG_BINARY, "-hide_banner", "-loglevel", "error",
+                "-fflags", "nobuffer", "-f", input_format, "-i", "pipe:0",
+                "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "pipe:1",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._pending: "queue.Queue[Optional[bytes]]" = queue.Queue()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._writer = threading.Thread(target=self._write_loop, name="decode-in", daemon=True)
+        self._reader = threading.Thread(target=self._read_loop, name="decode-out", daemon=True)
+        self._writer.start()
+        self._reader.start()
+
+    def feed(self, data: bytes):
+        if data:
+            self.bytes_in += len(data)
+            self._pending.put(data)
+
+    def close(self, timeout: float = 2.0):
+        """Ends the input, lets ffmpeg drain its last frames and reaps the process."""
+        self._pending.put(None)
+        self._writer.join(timeout)
+        self._reader.join(timeout)
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.wait()
+
+    def _write_loop(self):
+        stdin = self._proc.stdin
+        try:
+            while (data := self._pending.get()) is not None:
+                stdin.write(data)
+                stdin.flush()
+        except (BrokenPipeError, ValueError, OSError) as e:
+            logger.warning("Audio decoder input closed: %s", e)
+        finally:
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+    def _read_loop(self):
+        stdout = self._proc.stdout
+        while chunk := stdout.read1(READ_SIZE):
+            self.bytes_out += len(chunk)
+            try:
+                self._on_pcm(chunk)
+            except Exception as e:
+                logger.exception("Decoded audio callback failed: %s", e)
+
+
+def _wav_input(data: bytes) -> Optional[Tuple[List[str], int]]:
+    """
+    ffmpeg input options for the PCM of a streamed WAV file and the offset
+    where that PCM starts, or None while the header is still incomplete.
+    Anything but 16-bit PCM WAV gets ([], 0): ffmpeg probes it itself.
+    """
+    if len(data) < 12:
+        return None if b"RIFF".startswith(data[:4]) else ([], 0)
+    if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+        return [], 0
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = int.from_bytes(data[pos + 4:pos + 8], "little")
+        if chunk_id == b"fmt ":
+            if pos + 24 > len(data):
+                return None
+            audio_format, channels, rate = struct.unpack_from("<HHI", data, pos + 8)
+            bits = struct.unpack_from("<H", data, pos + 22)[0]
+            fmt = (channels, rate) if audio_format == 1 and bits == 16 else None
+        elif chunk_id == b"data":
+            if fmt is None:
+                return [], 0
+            channels, rate = fmt
+            return ["-f", "s16le", "-ar", str(rate), "-ac", str(channels)], pos + 8
+        pos += 8 + size + (size & 1)
+    return None
+
+
+class StreamingEncoder:
+    """
+    Compresses one synthesized clip (Murf's streamed WAV) to MP3 or Ogg/Opus
+    while it is still streaming in.
+
+    feed() pipes each chunk into ffmpeg right away and a reader thread hands
+    encoded bytes to on_data (called from that thread) as soon as ffmpeg
+    writes them, so only the encoder's last frame waits for close(). The WAV
+    header is parsed here and the PCM piped raw, which spares ffmpeg from
+    probing a stream whose length is unknown. close() flushes the encoder
+    and returns once on_data has received everything; the encoder is also a
+    context manager that closes on exit.
+    """
+
+    def __init__(self, on_data: Callable[[bytes], None], output_format: str = OUTPUT_OPUS, bitrate_kbps: int = 32):
+        self._on_data = on_data
+        self.output_format = output_format
+        self._output_args = _ENCODER_ARGS[output_format] + ["-b:a", f"{bitrate_kbps}k"]
+        self._proc: Optional[subprocess.Popen] = None
+        self._reader: Optional[threading.Thread] = None
+        self._header = b""
+        self._failed = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def __enter__(self) -> "StreamingEncoder":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def feed(self, data: bytes):
+        if not data or self._failed:
+            return
+        self.bytes_in += len(data)
+        if self._proc is None:
+            # Hold bytes back until the WAV header tells us the PCM layout
+            self._header += data
+            found = _wav_input(self._header)
+            if found is None:
+                return
+            input_args, offset = found
+            self._start(input_args)
+            data, self._header = self._header[offset:], b""
+        self._write(data)
+
+    def close(self, timeout: float = ENCODER_CLOSE_TIMEOUT_SECONDS):
+        """
+        Flushes ffmpeg and waits for its last bytes. Under load the flush can
+        take a while, so ffmpeg is only killed once it has produced nothing
+        for `timeout` seconds.
+        """
+        if self._proc is None:
+            if not self._header:
+                return
+            # Never saw a complete header: let ffmpeg make sense of what arrived
+            self._start([])
+            self._write(self._header)
+            self._header = b""
+        try:
+            self._proc.stdin.close()
+        except OSError:
+            pass
+        progress = -1
+        while self._reader.is_alive() and self.bytes_out != progress:
+            progress = self.bytes_out
+            self._reader.join(timeout)
+        if self._reader.is_alive():
+            metrics.encoder_timeouts_total.inc(format=self.output_format)
+            logger.warning(
+                "%s encoder stalled for %.1fs while flushing (%d bytes in, %d out); the clip's tail is lost.",
+                self.output_format, timeout, self.bytes_in, self.bytes_out,
+            )
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.wait()
+
+    def _start(self, input_args: List[str]):
+        if input_args:
+            # Raw PCM needs no probing; otherwise ffmpeg buffers seconds of input first
+            input_args = ["-probesize", "32", "-analyzeduration", "0"] + input_args
+        self._proc = subprocess.Popen(
+            [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error"]
+            + input_args
+            + ["-i", "pipe:0", "-ac", "1", "-ar", str(ENCODE_SAMPLE_RATE)]
+            + self._output_args
+            + ["-flush_packets", "1", "pipe:1"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._reader = threading.Thread(target=self._read_loop, name="encode-out", daemon=True)
+        self._reader.start()
+
+    def _write(self, data: bytes):
+        if not data:
+            return
+        try:
+            self._proc.stdin.write(data)
+            self._proc.stdin.flush()
+        except (BrokenPipeError, ValueError, OSError) as e:
+            self._failed = True
+            logger.warning("Audio encoder input closed: %s", e)
+
+    def _read_loop(self):
+        stdout = self._proc.stdout
+        while chunk := stdout.read1(ENCODED_READ_SIZE):
+            self.bytes_out += len(chunk)
+            try:
+                self._on_data(chunk)
+            except Exception as e:
+                logger.exception("Encoded audio callback failed: %s", e)
@@ -0,0 +1,83 @@
+# services/history.py
+"""
+Token-budgeted conversation history.
+
+Keeps the last few turns verbatim and folds older ones into a rolling
+summary, so prompt size (and Gemini latency/cost) stays flat over long
+sessions instead of growing with every turn.
+"""
+from typing import Any, List, Tuple
+
+SUMMARY_PREFIX = "[Conversation so far]"
+SUMMARY_ACK = "Got it."
+FOLD_CHARS = 160  # per side of a turn when it is folded into the summary
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English)."""
+    return len(text) // 4 + 1
+
+
+def message_role(message: Any) -> str:
+    return message["role"] if isinstance(message, dict) else message.role
+
+
+def message_text(message: Any) -> str:
+    parts = message["parts"] if isinstance(message, dict) else message.parts
+    return "".join(p if isinstance(p, str) else getattr(p, "text", "") for p in parts)
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+class HistoryWindow:
+    """
+    Compacts a chat history (Gemini Content objects or {"role", "parts"}
+    dicts) to at most `keep_turns` verbatim user/model turns within
+    `token_budget`, preceded by a summary turn of everything older.
+    """
+
+    def __init__(self, token_budget: int, keep_turns: int, summary_chars: int):
+        self.token_budget = token_budget
+        self.keep_turns = max(1, keep_turns)
+        self.summary_chars = summary_chars
+
+    def compact(self, messages: List[Any], summary: str = "") -> Tuple[List[Any], str, bool]:
+        """Returns (messages, summary, changed)."""
+        if messages and message_role(messages[0]) == "user" and message_text(messages[0]).startswith(SUMMARY_PREFIX):
+            messages = messages[2:]
+
+        turns = [messages[i:i + 2] for i in range(0, len(messages), 2)]
+        tokens = sum(estimate_tokens(message_text(m)) for m in messages) + estimate_tokens(summary)
+
+        changed = False
+        while len(turns) > 1 and (len(turns) > self.keep_turns or tokens > self.token_budget):
+            turn = turns.pop(0)
+            before = estimate_tokens(summary)
+            summary = self._fold(summary, turn)
+            tokens += estimate_tokens(summary) - before - sum(estimate_tokens(message_text(m)) for m in turn)
+            changed = True
+
+        if not changed:
+            return messages if not summary else self._with_summary(messages, summary), summary, False
+        flat = [m for turn in turns for m in turn]
+        return self._with_summary(flat, summary), summary, True
+
+    def _fold(self, summary: str, turn: List[Any]) -> str:
+        line = " / ".join(
+            f"{'User' if message_role(m) == 'user' else 'You'}: {_clip(message_text(m), FOLD_CHARS)}" for m in turn
+        )
+        summary = f"{summary}\n{line}" if summary else line
+        # Rolling: once over budget, the oldest lines fall off first
+        while len(summary) > self.summary_chars and "\n" in summary:
+            summary = summary.split("\n", 1)[1]
+        return summary[-self.summary_chars:]
+
+    @staticmethod
+    def _with_summary(messages: List[Any], summary: str) -> List[Any]:
+        return [
+            {"role": "user", "parts": [f"{SUMMARY_PREFIX}\n{summary}"]},
+            {"role": "model", "parts": [SUMMARY_ACK]},
+        ] + list(messages)
@@ -2,12 +2,25 @@
 """
 SILLY AI LLM utilities (Gemini + SerpAPI + News)
 """
-import google.generativeai as genai
-from typing import List, Dict, Any, Tuple
-from serpapi import GoogleSearch
+from typing import Callable, List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+import functools
+import hashlib
 import logging
 import re
+import threading
+import time
+from services import admission, metrics, sessions
 from services import news as news_service
+from services import search as search_service
+from services.router import Router, Route, DEFAULT_RULES, INTENT_NEWS, INTENT_WEB
+from services.history import HistoryWindow, message_role, message_text
+from services.cache import TTLCache
+from config import (
+    GEMINI_API_KEY, CHAT_IDLE_TTL_SECONDS, CHAT_MAX_SESSIONS, CHAT_MAX_HISTORY_MESSAGES, ROUTING_RULES_FILE,
+    HISTORY_TOKEN_BUDGET, HISTORY_KEEP_TURNS, HISTORY_SUMMARY_CHARS, LLM_TIMEOUT_SECONDS,
+    NEWS_CACHE_TTL_SECONDS, SUMMARY_CACHE_MAX_ENTRIES,
+)
 
 # ---------------- LOGGING ----------------
 logger = logging.getLogger(__name__)
@@ -55,116 +68,557 @@ Keep your replies short, clear, and fun to hear.
 """
 })
 
+# ---------------- CANNED REPLIES ----------------
+# Hardcoded instant replies (fast path) and their persona-specific overrides
+QUICK_REPLIES = {
+    "hello": "Hey buddy, welcome to Silly Yard :) How can I make your day brighter? 😄",
+    "hi": "Hey buddy, welcome to Silly Yard :) How can I make your day brighter? 😄",
+    "hey": "Hey buddy, welcome to Silly Yard :) How can I make your day brighter? 😄",
+    "bye": "ooooo noooo , ok buddy Catch you later👋",
+    "good night": "Ok Buddy , GOOD NIGHT :) Sleep tight! 🌙😴",
+    "thanks": "Anytime, amigo! 🤝 Always here to help.",
+    "thank you": "Anytime, amigo! 🤝 Always here to help.",
+}
+
+PERSONA_QUICK_REPLIES = {
+    "cowboy": {
+        "hello": "Howdy, partner! Ready to wrangle some questions? 🤠",
+        "hi": "Howdy, partner! Ready to wrangle some questions? 🤠",
+        "bye": "Well, I'll be. Catch ya later, pilgrim! 👋",
+    },
+    "pirate": {
+        "hello": "Ahoy, matey! What treasure be ye seekin' today? 🏴‍☠️",
+        "bye": "Shiver me timbers! Fair winds to ye, matey! 👋",
+    },
+    "robot": {
+        "hello": "INITIATING GREETING PROTOCOL. HOW CAN I ASSIST? 🤖",
+        "bye": "TERMINATING CONVERSATION. GOODBYE. 👋",
+    },
+    "teacher": {
+        "hello": "Hello there! Let's begin our lesson. What can we learn about today? 👩‍🏫",
+        "bye": "Class dismissed! Have a wonderful day! 👋",
+    },
+}
+
+LLM_UNAVAILABLE_REPLY = "I can't reach the LLM right now. Try again later."
+LLM_ERROR_REPLY = "Oops 🤖💥 something went wrong while processing your request."
+WEB_EMPTY_REPLY = "Hmm 🤔 I couldn't find anything useful on the web."
+WEB_ERROR_REPLY = "Uh-oh 😬 I hit a snag while searching the web."
+NEWS_ERROR_REPLY = "Uh-oh 😬 I hit a snag while fetching the latest headlines."
+
+def canned_replies() -> List[str]:
+    """Every fixed line the assistant can speak: quick replies for all personas plus error lines."""
+    lines = list(QUICK_REPLIES.values())
+    for overrides in PERSONA_QUICK_REPLIES.values():
+        lines.extend(overrides.values())
+    lines += [LLM_UNAVAILABLE_REPLY, LLM_ERROR_REPLY, WEB_EMPTY_REPLY, WEB_ERROR_REPLY, NEWS_ERROR_REPLY]
+    return list(dict.fromkeys(lines))
+
 # ---------------- INIT GEMINI MODEL ----------------
-chat = None
-current_persona = "me"  # Default persona
+DEFAULT_SESSION = "default"
 
-def init_model(api_key: str, persona: str = "me"):
-    """Initialize persistent Gemini chat model with a specific persona."""
-    global chat, current_persona
-    if api_key is None:
-        logger.warning("No Gemini API key provided to init_model.")
-    if chat is None or persona != current_persona:
-        current_persona = persona
-        try:
-            genai.configure(api_key=api_key)
+# Gemini's deadline covers the whole (streamed) reply
+REQUEST_OPTIONS = {"timeout": LLM_TIMEOUT_SECONDS}
+
+# GenerativeModel instances are shared per (api_key, persona) so new sessions
+# skip model construction; each model is pinned to its key's client because the
+# SDK otherwise resolves the client lazily from the process-global config.
+_models: Dict[Tuple[str, str], Any] = {}
+_clients: Dict[str, Any] = {}
+_models_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=None)
+def _genai():
+    """Imports and configures the Gemini SDK once, on first use (it is slow to import)."""
+    import google.generativeai as genai
+    if GEMINI_API_KEY:
+        genai.configure(api_key=GEMINI_API_KEY)
+    return genai
+
+def warm_up():
+    """Loads the Gemini SDK ahead of the first turn."""
+    _genai()
+
+def _get_model(api_key: str, persona: str):
+    persona = persona if persona in PERSONAS else "me"
+    key = (api_key or "", persona)
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            genai = _genai()
+            from google.generativeai import client as genai_client
+            client = _clients.get(key[0])
+            if client is None:
+                genai.configure(api_key=api_key)
+                client = genai_client.get_default_generative_client()
+                _clients[key[0]] = client
             model = genai.GenerativeModel(
                 'gemini-1.5-flash',
-                system_instruction=PERSONAS.get(persona, PERSONAS["me"])
+                system_instruction=PERSONAS[persona]
             )
-            chat = model.start_chat(history=[])
-        except Exception as e:
-            logger.exception("Failed to init Gemini model: %s", e)
-            chat = None
-    return chat
+            model._client = client
+            _models[key] = model
+        return model
+
+class _ChatEntry:
+    __slots__ = ("chat", "api_key", "persona", "lock", "last_used", "summary", "messages")
+
+    def __init__(self, chat, api_key: str, persona: str, messages: int = 0):
+        self.chat = chat
+        self.api_key = api_key
+        self.persona = persona
+        self.summary = ""  # rolling summary of turns folded out of the history window
+        # len(chat.history) as of the last recorded turn. The registry sums these
+        # instead of reading other sessions' history, which the SDK mutates on read.
+        self.messages = messages
+        # Serializes send_message so concurrent turns can't race on history.
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+class ChatRegistry:
+    """
+    Session-scoped Gemini chats with idle-TTL expiry, LRU eviction and a cap
+    on the total number of history messages held in memory. A chat is a
+    cache of its session in sessions.store: one that is (re)built -- for a
+    resumed session, after eviction, or on another worker -- starts from the
+    session's stored turns.
+    """
+
+    def __init__(self, idle_ttl: float, max_sessions: int, max_messages: int):
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_messages = max_messages
+        self._entries: "OrderedDict[str, _ChatEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, api_key: str, persona: str) -> _ChatEntry:
+        """Returns the session's chat, (re)building it if the persona or key changed."""
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(session_id)
+            if entry is not None and entry.persona == persona and entry.api_key == api_key:
+                entry.last_used = time.monotonic()
+                self._entries.move_to_end(session_id)
+                return entry
+
+        # Stored turns go through the history window, as if the chat had never been dropped
+        messages, summary, _ = history_window.compact(sessions.store.history(session_id))
+        chat = _get_model(api_key, persona).start_chat(history=messages)
+        entry = _ChatEntry(chat, api_key, persona, len(messages))
+        entry.summary = summary
+        with self._lock:
+            self._entries[session_id] = entry
+            self._entries.move_to_end(session_id)
+            self._enforce_limits(keep=session_id)
+        return entry
+
+    def release(self, session_id: str):
+        with self._lock:
+            self._entries.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expire(self, now: float):
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if now - entry.last_used < self.idle_ttl:
+                break
+            del self._entries[session_id]
+
+    def _enforce_limits(self, keep: str):
+        while len(self._entries) > self.max_sessions:
+            if not self._evict_oldest(keep):
+                break
+        total = sum(e.messages for e in self._entries.values())
+        while total > self.max_messages:
+            evicted = self._evict_oldest(keep)
+            if evicted is None:
+                break
+            total -= evicted.messages
+
+    def _evict_oldest(self, keep: str):
+        for session_id in self._entries:
+            if session_id != keep:
+                logger.info("Evicting Gemini chat for session %s", session_id)
+                return self._entries.pop(session_id)
+        return None
+
+chats = ChatRegistry(CHAT_IDLE_TTL_SECONDS, CHAT_MAX_SESSIONS, CHAT_MAX_HISTORY_MESSAGES)
+history_window = HistoryWindow(HISTORY_TOKEN_BUDGET, HISTORY_KEEP_TURNS, HISTORY_SUMMARY_CHARS)
+
+def _init_entry(api_key: str, persona: str, session_id: str) -> Optional[_ChatEntry]:
+    if api_key is None:
+        logger.warning("No Gemini API key provided to init_model.")
+    try:
+        return chats.get(session_id, api_key, persona)
+    except Exception as e:
+        logger.exception("Failed to init Gemini model: %s", e)
+        return None
+
+def init_model(api_key: str, persona: str = "me", session_id: str = DEFAULT_SESSION):
+    """Initialize (or fetch) the session's persistent Gemini chat with a specific persona."""
+    entry = _init_entry(api_key, persona, session_id)
+    return entry.chat if entry else None
+
+def release_session(session_id: str):
+    """Drops the session's chat; called when its WebSocket closes."""
+    chats.release(session_id)
+
+# ---------------- INTENT ROUTING ----------------
+# Per-persona quick-reply tables and the compiled intent router are built
+# once at import; ROUTING_RULES_FILE swaps in a custom rule set.
+QUICK_REPLY_TABLES = {
+    persona: {**QUICK_REPLIES, **PERSONA_QUICK_REPLIES.get(persona, {})}
+    for persona in PERSONAS
+}
+
+if ROUTING_RULES_FILE:
+    router = Router.from_file(ROUTING_RULES_FILE, QUICK_REPLY_TABLES)
+else:
+    router = Router(DEFAULT_RULES, QUICK_REPLY_TABLES)
+
+def set_router(new_router: Router):
+    """Replaces the routing engine (e.g. with a custom rule set)."""
+    global router
+    router = new_router
+
+def route(user_query: str, persona: str = "me") -> Route:
+    """Decides how a transcript is answered: quick reply, news, web search or chat."""
+    return router.route(user_query, persona)
 
-# ---------------- RULE-BASED SEARCH DETECTION ----------------
 def should_search_web(user_query: str) -> bool:
     """
     Rule-based detection for when to use web search.
     """
-    keywords = ["weather", "temperature", "news", "latest", "today", "tomorrow",
-                "who is", "what is", "population", "price", "time in", "score"]
-    return any(k in user_query.lower() for k in keywords)
+    return router.route(user_query).intent == INTENT_WEB
 
 def should_fetch_news(user_query: str) -> bool:
     """
     Detects if the user is asking for news.
     """
-    news_keywords = ["news", "latest headlines", "what's happening", "current events"]
-    return any(k in user_query.lower() for k in news_keywords)
+    return router.route(user_query).intent == INTENT_NEWS
 
 # ---------------- LLM RESPONSE ----------------
+class _PartialReply(Exception):
+    """Raised when a streamed reply fails after some text was already emitted."""
+
+    def __init__(self, text: str):
+        super().__init__(text)
+        self.text = text
+
+def _abort_stream(response):
+    """Cancels the RPC behind a streamed Gemini response (best-effort)."""
+    cancel = getattr(getattr(response, "_iterator", None), "cancel", None)
+    if callable(cancel):
+        try:
+            cancel()
+        except Exception:
+            pass
+
+@functools.lru_cache(maxsize=None)
+def _stopped_reply_errors() -> Tuple[type, ...]:
+    """What the SDK raises for a blocked prompt or a reply Gemini stopped early (SAFETY, RECITATION, ...)."""
+    from google.generativeai.types import generation_types
+    return (
+        generation_types.BlockedPromptException,
+        generation_types.BrokenResponseError,
+        generation_types.StopCandidateException,
+    )
+
+def _commit_reply(chat) -> bool:
+    """
+    Folds the reply just received into the chat's history (reading
+    chat.history does that). A reply Gemini stopped early can't be folded
+    and would break every later send_message of the session, so it is
+    rewound instead. Returns whether the exchange was kept.
+    """
+    try:
+        chat.history
+    except _stopped_reply_errors():
+        reason = chat.last.candidates[0].finish_reason
+        logger.warning("Gemini stopped the reply early (%s); dropping it from the chat.", getattr(reason, "name", reason))
+        chat.rewind()
+        return False
+    return True
+
+def _stream_reply(
+    chat,
+    user_query: str,
+    on_chunk: Callable[[str], None],
+    cancel_event: Optional[threading.Event] = None
+) -> Tuple[str, bool]:
+    """Streams a reply into on_chunk; returns (text, whether the exchange was kept in history)."""
+    parts: List[str] = []
+    try:
+        response = chat.send_message(user_query, stream=True, request_options=REQUEST_OPTIONS)
+        for chunk in response:
+            if cancel_event is not None and cancel_event.is_set():
+                # Turn was interrupted: stop paying for tokens nobody will hear
+                _abort_stream(response)
+                chat.rewind()
+                return "".join(parts), False
+            try:
+                piece = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. the final finish_reason chunk)
+                piece = ""
+            if piece:
+                parts.append(piece)
+                on_chunk(piece)
+    except _stopped_reply_errors():
+        # The prompt itself was blocked: Gemini answered, so the breaker stays out of it
+        if chat.last is not None:
+            chat.rewind()
+        return "".join(parts) or LLM_ERROR_REPLY, False
+    except Exception as e:
+        if chat.last is not None:
+            # Drop the broken exchange so later turns don't trip over it
+            chat.rewind()
+        if parts:
+            raise _PartialReply("".join(parts)) from e
+        raise
+    if not _commit_reply(chat):
+        # Blocked, not failed: keep what was already said, and the breaker out of it
+        return "".join(parts) or LLM_ERROR_REPLY, False
+    return "".join(parts), True
+
+def _record_turn(entry: _ChatEntry, record_as: Optional[str], session_id: str):
+    """
+    Keeps the session's chat history bounded after a turn: the plain question
+    replaces any bulky search/news context injected into the prompt, and the
+    history is compacted to the token-budgeted window. The turn is also
+    appended to the session store.
+    """
+    chat = entry.chat
+    messages = list(chat.history)
+    replaced = False
+    if record_as is not None and len(messages) >= 2 and message_role(messages[-2]) == "user":
+        messages[-2] = {"role": "user", "parts": [record_as]}
+        replaced = True
+    if len(messages) >= 2:
+        try:
+            sessions.store.append(session_id, message_text(messages[-2]), message_text(messages[-1]))
+        except Exception as e:
+            logger.warning("Could not store turn of session %s: %s", session_id, e)
+    messages, entry.summary, compacted = history_window.compact(messages, entry.summary)
+    if replaced or compacted:
+        chat.history = messages
+    entry.messages = len(messages)
+
 def get_llm_response(
     user_query: str,
     history: List[Dict[str, Any]],
     api_key: str,
-    persona: str = "me"
+    persona: str = "me",
+    session_id: str = DEFAULT_SESSION,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    record_as: Optional[str] = None
 ) -> Tuple[str, List[Dict[str, Any]]]:
     """
-    Generate a response from Gemini LLM.
+    Generate a response from Gemini LLM using the session's persistent chat.
+    If on_chunk is given, the reply is streamed and each text fragment is
+    passed to it as it arrives; the full text is still returned at the end.
+    Setting cancel_event aborts a streamed reply at the next chunk.
+    record_as is what the user turn is remembered as (e.g. the plain question
+    instead of a prompt carrying search results).
+    Raises admission.AdmissionError if Gemini calls are being refused.
     """
     try:
-        normalized = user_query.strip().lower()
-
         # Hardcoded instant replies (fast path)
-        quick_replies = {
-            "hello": "Hey buddy, welcome to Silly Yard :) How can I make your day brighter? 😄",
-            "hi": "Hey buddy, welcome to Silly Yard :) How can I make your day brighter? 😄",
-            "hey": "Hey buddy, welcome to Silly Yard :) How can I make your day brighter? 😄",
-            "bye": "ooooo noooo , ok buddy Catch you later👋",
-            "good night": "Ok Buddy , GOOD NIGHT :) Sleep tight! 🌙😴",
-            "thanks": "Anytime, amigo! 🤝 Always here to help.",
-            "thank you": "Anytime, amigo! 🤝 Always here to help.",
-        }
-
-        # Persona-specific overrides
-        if persona == "cowboy":
-            quick_replies.update({
-                "hello": "Howdy, partner! Ready to wrangle some questions? 🤠",
-                "hi": "Howdy, partner! Ready to wrangle some questions? 🤠",
-                "bye": "Well, I'll be. Catch ya later, pilgrim! 👋",
-            })
-        elif persona == "pirate":
-            quick_replies.update({
-                "hello": "Ahoy, matey! What treasure be ye seekin' today? 🏴‍☠️",
-                "bye": "Shiver me timbers! Fair winds to ye, matey! 👋",
-            })
-        elif persona == "robot":
-            quick_replies.update({
-                "hello": "INITIATING GREETING PROTOCOL. HOW CAN I ASSIST? 🤖",
-                "bye": "TERMINATING CONVERSATION. GOODBYE. 👋",
-            })
-        elif persona == "teacher":
-            quick_replies.update({
-                "hello": "Hello there! Let's begin our lesson. What can we learn about today? 👩‍🏫",
-                "bye": "Class dismissed! Have a wonderful day! 👋",
-            })
-
-        if normalized in quick_replies:
-            reply = quick_replies[normalized]
+        reply = router.quick_reply(user_query, persona)
+        if reply is not None:
             history.append({"role": "user", "parts": [user_query]})
             history.append({"role": "model", "parts": [reply]})
+            del history[:-2 * HISTORY_KEEP_TURNS]
             return reply, history
         
+        if cancel_event is not None and cancel_event.is_set():
+            # Interrupted while search/news context was being fetched
+            return "", history
+
         # For news and web search, delegate to dedicated functions (the caller should choose which)
-        # Persistent Gemini chat
-        chat = init_model(api_key, persona)
-        if chat is None:
-            return "I can't reach the LLM right now. Try again later.", history
+        # Persistent, session-scoped Gemini chat
+        entry = _init_entry(api_key, persona, session_id)
+        if entry is None:
+            return LLM_UNAVAILABLE_REPLY, history
 
         try:
-            response = chat.send_message(user_query)
-            # gemini response object may vary; best-effort:
-            text = getattr(response, "text", None) or str(response)
-            return text, chat.history if hasattr(chat, "history") else history
+            with entry.lock:
+                chat = entry.chat
+                with admission.admit("gemini", api_key):
+                    if on_chunk is None:
+                        try:
+                            response = chat.send_message(user_query, request_options=REQUEST_OPTIONS)
+                            if cancel_event is not None and cancel_event.is_set():
+                                # Barged in while Gemini was answering: nobody will hear it
+                                chat.rewind()
+                                return "", history
+                            # gemini response object may vary; best-effort:
+                            text = getattr(response, "text", None) or str(response)
+                            recorded = _commit_reply(chat)
+                        except _stopped_reply_errors():
+                            # Raised before the exchange joins the chat: nothing to rewind
+                            text, recorded = LLM_ERROR_REPLY, False
+                    else:
+                        text, recorded = _stream_reply(chat, user_query, on_chunk, cancel_event)
+                # Bookkeeping runs outside admit() so its errors never count against Gemini
+                if recorded:
+                    try:
+                        _record_turn(entry, record_as, session_id)
+                    except Exception as e:
+                        logger.exception("Could not record turn of session %s: %s", session_id, e)
+                return text, list(chat.history) if hasattr(chat, "history") else history
+        except admission.AdmissionError:
+            raise
+        except _PartialReply as e:
+            # Part of the reply already reached the caller; keep what was said.
+            logger.exception("Gemini stream broke off: %s", e.__cause__)
+            metrics.upstream_error("gemini")
+            return e.text, history
         except Exception as e:
             logger.exception("Error sending message to Gemini: %s", e)
-            return "Oops 🤖💥 something went wrong while processing your request.", history
+            metrics.upstream_error("gemini")
+            return LLM_ERROR_REPLY, history
 
+    except admission.AdmissionError:
+        raise
     except Exception as e:
         logger.exception(f"Error in get_llm_response: {e}")
-        return "Oops 🤖💥 something went wrong while processing your request.", history
+        return LLM_ERROR_REPLY, history
+
+# ---------------- WEB / NEWS SUMMARIES ----------------
+# Answers built from fetched search results or headlines don't depend on the
+# conversation, so they are generated statelessly (generate_content, not the
+# session's chat) and cached per (persona, normalized question, context
+# hash) for as long as the context itself is fresh: identical questions over
+# the same results share one Gemini call across sessions. Only the plain
+# question and the answer join the session's history.
+_summary_cache = TTLCache(NEWS_CACHE_TTL_SECONDS, SUMMARY_CACHE_MAX_ENTRIES)
+
+def summary_cache_stats() -> Dict[str, float]:
+    """Hit/miss counters for the web/news answer cache; every hit is a Gemini call saved."""
+    hits, misses = _summary_cache.hits, _summary_cache.misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "gemini_calls_saved": hits,
+    }
+
+def _stop_reason(response) -> Optional[str]:
+    """Why Gemini blocked or cut short a stateless generation (SAFETY, RECITATION, ...), or None."""
+    candidates = getattr(response, "candidates", None)
+    if candidates:
+        reason = candidates[0].finish_reason
+        name = getattr(reason, "name", str(reason))
+        return None if name in ("STOP", "MAX_TOKENS", "FINISH_REASON_UNSPECIFIED") else name
+    block = getattr(getattr(response, "prompt_feedback", None), "block_reason", None)
+    return getattr(block, "name", str(block)) if block else None
+
+def _stream_generation(
+    model,
+    prompt: str,
+    on_chunk: Callable[[str], None],
+    cancel_event: Optional[threading.Event] = None
+) -> Tuple[str, bool]:
+    """
+    Streams a stateless generation into on_chunk; returns (text, whether it
+    ran to completion). An answer Gemini blocked or stopped early doesn't.
+    """
+    parts: List[str] = []
+    try:
+        response = model.generate_content(prompt, stream=True, request_options=REQUEST_OPTIONS)
+        for chunk in response:
+            if cancel_event is not None and cancel_event.is_set():
+                _abort_stream(response)
+                return "".join(parts), False
+            try:
+                piece = chunk.text
+            except ValueError:
+                piece = ""
+            if piece:
+                parts.append(piece)
+                on_chunk(piece)
+    except Exception as e:
+        if parts:
+            raise _PartialReply("".join(parts)) from e
+        raise
+    reason = _stop_reason(response)
+    if reason is not None:
+        logger.warning("Gemini stopped the answer early (%s); not caching it.", reason)
+        return "".join(parts) or LLM_ERROR_REPLY, False
+    return "".join(parts), True
+
+def _remember_turn(entry: _ChatEntry, question: str, answer: str, session_id: str):
+    """Adds a turn answered outside the chat to the session's history (and store)."""
+    with entry.lock:
+        entry.chat.history = list(entry.chat.history) + [
+            {"role": "user", "parts": [question]},
+            {"role": "model", "parts": [answer]},
+        ]
+        _record_turn(entry, None, session_id)
+
+def _summarize(
+    user_query: str,
+    context: str,
+    prompt: str,
+    ttl: float,
+    history: List[Dict[str, Any]],
+    api_key: str,
+    persona: str,
+    session_id: str,
+    on_chunk: Optional[Callable[[str], None]],
+    cancel_event: Optional[threading.Event]
+) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Answers a web/news question from its fetched context, from the summary
+    cache when possible. Raises admission.AdmissionError if Gemini calls
+    are being refused.
+    """
+    if cancel_event is not None and cancel_event.is_set():
+        return "", history
+    entry = _init_entry(api_key, persona, session_id)
+    if entry is None:
+        return LLM_UNAVAILABLE_REPLY, history
+
+    key = (persona, search_service.normalize_query(user_query), hashlib.sha256(context.encode()).hexdigest())
+    text = _summary_cache.get(key)
+    if text is not None:
+        metrics.summary_cache_total.inc(outcome="hit")
+    else:
+        metrics.summary_cache_total.inc(outcome="miss")
+        try:
+            model = _get_model(api_key, persona)
+            with admission.admit("gemini", api_key):
+                try:
+                    if on_chunk is None:
+                        response = model.generate_content(prompt, request_options=REQUEST_OPTIONS)
+                        text, complete = getattr(response, "text", None) or str(response), _stop_reason(response) is None
+                    else:
+                        text, complete = _stream_generation(model, prompt, on_chunk, cancel_event)
+                except (ValueError,) + _stopped_reply_errors() as e:
+                    # A blocked prompt, or an answer stopped before any text (response.text
+                    # raises ValueError): Gemini is up, so this must not trip its breaker
+                    logger.warning("Gemini returned no answer (%s); not caching it.", type(e).__name__)
+                    text, complete = LLM_ERROR_REPLY, False
+        except admission.AdmissionError:
+            raise
+        except _PartialReply as e:
+            logger.exception("Gemini stream broke off: %s", e.__cause__)
+            metrics.upstream_error("gemini")
+            return e.text, history
+        except Exception as e:
+            logger.exception("Error generating from Gemini: %s", e)
+            metrics.upstream_error("gemini")
+            return LLM_ERROR_REPLY, history
+        if not complete:
+            return text, history  # interrupted or stopped early: neither cached nor remembered
+        _summary_cache.put(key, text, ttl=ttl)
+
+    _remember_turn(entry, user_query, text, session_id)
+    return text, list(entry.chat.history)
 
 # ---------------- WEB RESPONSE ----------------
 def get_web_response(
@@ -172,32 +626,37 @@ def get_web_response(
     history: List[Dict[str, Any]],
     gemini_api_key: str,
     serp_api_key: str,
-    persona: str = "me"
+    persona: str = "me",
+    session_id: str = DEFAULT_SESSION,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    trace: Optional[metrics.TurnTrace] = None
 ) -> Tuple[str, List[Dict[str, Any]]]:
     """
     Perform a web search using SerpAPI and return an LLM-crafted reply.
     """
     try:
-        params = {"q": user_query, "api_key": serp_api_key, "engine": "google"}
-        search = GoogleSearch(params)
-        results = search.get_dict()
+        with metrics.timed("fetch", trace):
+            snippets = search_service.search_snippets(user_query, serp_api_key)
 
-        if "organic_results" in results:
-            snippets = [r.get("snippet", "") for r in results["organic_results"][:3]]
+        if snippets:
             search_context = "\n".join(snippets)
             prompt = (
                 f"User asked: '{user_query}'\n\n"
                 f"Based on these search results:\n{search_context}\n\n"
                 f"Give a short, witty, and clear reply as the {persona} persona."
             )
-            # Use the LLM to craft the final response
-            return get_llm_response(prompt, history, api_key=gemini_api_key, persona=persona)
+            # Use the LLM to craft the final response; it's as fresh as the results
+            ttl = search_service.ttl_for(search_service.normalize_query(user_query))
+            return _summarize(user_query, search_context, prompt, ttl, history, gemini_api_key, persona, session_id, on_chunk, cancel_event)
         else:
-            return "Hmm 🤔 I couldn't find anything useful on the web.", history
+            return WEB_EMPTY_REPLY, history
 
+    except admission.AdmissionError:
+        raise
     except Exception as e:
         logger.exception(f"Error in web search: {e}")
-        return "Uh-oh 😬 I hit a snag while searching the web.", history
+        return WEB_ERROR_REPLY, history
         
 # ---------------- NEWS RESPONSE ----------------
 def get_news_response(
@@ -205,21 +664,28 @@ def get_news_response(
     history: List[Dict[str, Any]],
     api_key: str,
     news_api_key: str,
-    persona: str = "me"
+    persona: str = "me",
+    session_id: str = DEFAULT_SESSION,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    cancel_event: Optional[threading.Event] = None,
+    trace: Optional[metrics.TurnTrace] = None
 ) -> Tuple[str, List[Dict[str, Any]]]:
     """
     Fetches news, uses the LLM to summarize it, and returns a persona-appropriate response.
     """
     try:
-        news_text = news_service.get_news_response(query=user_query, news_api_key=news_api_key)
+        with metrics.timed("fetch", trace):
+            news_text = news_service.get_news_response(query=user_query, news_api_key=news_api_key)
         
         prompt = (
             f"User asked for news: '{user_query}'\n\n"
             f"Here is some recent news:\n{news_text}\n\n"
             f"Give a short, witty, and clear summary of the news as the {persona} persona."
         )
-        return get_llm_response(prompt, history, api_key=api_key, persona=persona)
+        return _summarize(user_query, news_text, prompt, NEWS_CACHE_TTL_SECONDS, history, api_key, persona, session_id, on_chunk, cancel_event)
     
+    except admission.AdmissionError:
+        raise
     except Exception as e:
         logger.exception(f"Error in news response: {e}")
-        return "Uh-oh 😬 I hit a snag while fetching the latest headlines.", history
+        return NEWS_ERROR_REPLY, history
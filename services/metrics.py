@@ -0,0 +1,224 @@
+# services/metrics.py
+"""
+Minimal Prometheus-style metrics (counters, gauges, histograms) rendered in
+the text exposition format for the /metrics route, plus per-turn latency
+traces. Hand-rolled to avoid another dependency; all metric updates are
+thread-safe because upstream calls report from worker threads.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket..., +Inf count], sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((k, (list(c), t[0])) for k, (c, t) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = _format_labels(self.labelnames, key, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+turn_stage_seconds = registry.register(Histogram(
+    "voice_turn_stage_seconds",
+    "Latency of each stage of a voice turn (seconds).",
+    ("stage",),
+))
+turns_total = registry.register(Counter(
+    "voice_turns_total", "Voice turns by outcome (completed, interrupted, error, unavailable).", ("outcome",)
+))
+active_sessions = registry.register(Gauge("voice_active_sessions", "Open voice WebSocket sessions."))
+active_turns = registry.register(Gauge("voice_active_turns", "Voice turns currently being answered."))
+upstream_errors_total = registry.register(Counter(
+    "voice_upstream_errors_total", "Failed calls to upstream providers.", ("provider",)
+))
+admission_rejections_total = registry.register(Counter(
+    "voice_admission_rejections_total",
+    "Upstream calls refused by admission control, by reason (circuit_open, rate_limited, overloaded).",
+    ("provider", "reason"),
+))
+circuit_breakers_open = registry.register(Gauge(
+    "voice_circuit_breakers_open", "Open (or half-open) upstream circuit breakers.", ("provider",)
+))
+prefetches_total = registry.register(Counter(
+    "voice_prefetches_total",
+    "Speculative news/web fetches started from partial transcripts, by outcome (hit, wasted).",
+    ("outcome",),
+))
+
+cache_requests_total = registry.register(Counter(
+    "voice_cache_requests_total",
+    "Lookups in the upstream result caches, by cache (news, search) and outcome "
+    "(hit, miss = fetched upstream, coalesced = shared an in-flight fetch).",
+    ("cache", "outcome"),
+))
+encoder_timeouts_total = registry.register(Counter(
+    "voice_encoder_timeouts_total",
+    "Speech encoders killed because ffmpeg stopped flushing (the end of the clip was lost).",
+    ("format",),
+))
+summary_cache_total = registry.register(Counter(
+    "voice_summary_cache_total",
+    "Cache lookups for web/news answers, by outcome (hit = a Gemini call saved, miss).",
+    ("outcome",),
+))
+
+def upstream_error(provider: str):
+    upstream_errors_total.inc(provider=provider)
+
+
+class TurnTrace:
+    """
+    Collects the stage timings of one turn. Every value also feeds the
+    voice_turn_stage_seconds histogram; summary() is what the client gets
+    when it asked for debug timings. "mark" stages are measured from the
+    start of the turn (the final transcript), "span" stages are durations.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: Dict[str, float] = {}
+
+    def observe(self, stage: str, seconds: float):
+        turn_stage_seconds.observe(seconds, stage=stage)
+        # Per-turn summary keeps the first value observed (e.g. the first TTS first byte)
+        self.spans.setdefault(stage, seconds)
+
+    def mark(self, stage: str):
+        """Records the time since the turn started, once per stage."""
+        if stage not in self.spans:
+            self.observe(stage, time.perf_counter() - self.start)
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[None]:
+        with timed(stage, self):
+            yield
+
+    def summary(self) -> Dict[str, float]:
+        """Stage timings in milliseconds."""
+        return {stage: round(seconds * 1000, 1) for stage, seconds in self.spans.items()}
+
+
+@contextmanager
+def timed(stage: str, trace: Optional[TurnTrace] = None) -> Iterator[None]:
+    """Times a block into the stage histogram (and the turn's trace, if any)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if trace is not None:
+            trace.observe(stage, elapsed)
+        else:
+            turn_stage_seconds.observe(elapsed, stage=stage)
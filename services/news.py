@@ -1,42 +1,97 @@
 # services/news.py
 import requests
 import logging
-from typing import List, Dict, Any
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Any, Tuple
+
+from services import admission, metrics
+from services.cache import TTLCache, SingleFlight
+from config import NEWS_CACHE_TTL_SECONDS, NEWS_CACHE_MAX_ENTRIES, UPSTREAM_WORKERS, FETCH_TIMEOUT_SECONDS
 
 logger = logging.getLogger(__name__)
 NEWS_API_BASE_URL = "https://newsapi.org/v2"
 
-def get_news_response(query: str, news_api_key: str) -> str:
-    if not news_api_key:
-        return "I can't fetch the news without a valid API key."
+# Pooled, kept-alive connections to NewsAPI shared by all sessions
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=UPSTREAM_WORKERS))
+
+# Formatted headlines keyed on the normalized request (the API key is left
+# out so every user shares the same cached answer and NewsAPI quota).
+_cache = TTLCache(NEWS_CACHE_TTL_SECONDS, NEWS_CACHE_MAX_ENTRIES)
+_flight = SingleFlight()
 
+def _build_request(query: str) -> Tuple[str, Dict[str, Any]]:
     # On free plan, /top-headlines gives 401 → use /everything
     is_general_query = any(k in query.lower() for k in ["news", "latest", "headlines", "current events", "what's happening"])
-    
-    params = {"apiKey": news_api_key, "pageSize": 5, "language": "en"}
-    
+
+    params = {"pageSize": 5, "language": "en"}
+
     if is_general_query:
         url = f"{NEWS_API_BASE_URL}/everything"
         params["q"] = "latest"
     else:
         url = f"{NEWS_API_BASE_URL}/everything"
-        params["q"] = query
+        params["q"] = " ".join(query.lower().split())
+    return url, params
+
+def _cache_key(url: str, params: Dict[str, Any]) -> Tuple:
+    return (url,) + tuple(sorted(params.items()))
+
+def request_key(query: str) -> Tuple:
+    """The cache key a query's headlines are stored under (equal keys share one fetch)."""
+    return _cache_key(*_build_request(query))
 
+def _fetch(url: str, params: Dict[str, Any], news_api_key: str) -> Tuple[str, bool]:
+    """
+    Calls NewsAPI; returns (text for the LLM, whether it may be cached).
+    Raises admission.AdmissionError if the call is refused.
+    """
     try:
-        response = requests.get(url, params=params, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        with admission.admit("newsapi", news_api_key):
+            response = _session.get(url, params={**params, "apiKey": news_api_key}, timeout=FETCH_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            data = response.json()
 
         if data.get("status") == "ok" and data.get("articles"):
-            return format_articles_for_llm(data["articles"])
+            return format_articles_for_llm(data["articles"]), True
         else:
-            return "Looks like I couldn't find any news on that topic."
+            return "Looks like I couldn't find any news on that topic.", data.get("status") == "ok"
+    except admission.AdmissionError:
+        raise
     except requests.exceptions.HTTPError as e:
         logger.error(f"NewsAPI error: {e}")
-        return "⚠️ My NewsAPI key may not support this request."
+        metrics.upstream_error("newsapi")
+        return "⚠️ My NewsAPI key may not support this request.", False
     except Exception as e:
         logger.error(f"Unexpected news error: {e}")
-        return "Something went wrong while fetching the news."
+        metrics.upstream_error("newsapi")
+        return "Something went wrong while fetching the news.", False
+
+def get_news_response(query: str, news_api_key: str) -> str:
+    if not news_api_key:
+        return "I can't fetch the news without a valid API key."
+
+    url, params = _build_request(query)
+    key = _cache_key(url, params)
+    cached = _cache.get(key)
+    if cached is not None:
+        metrics.cache_requests_total.inc(cache="news", outcome="hit")
+        return cached
+
+    fetched = []
+
+    def fetch_and_store() -> str:
+        fetched.append(True)
+        text, cacheable = _fetch(url, params, news_api_key)
+        if cacheable:
+            _cache.put(key, text)
+        return text
+
+    # Concurrent identical requests share a single upstream call
+    try:
+        return _flight.do(key, fetch_and_store)
+    finally:
+        metrics.cache_requests_total.inc(cache="news", outcome="miss" if fetched else "coalesced")
 
 def format_articles_for_llm(articles: List[Dict[str, Any]], max_count: int = 3) -> str:
     if not articles:
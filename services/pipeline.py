@@ -0,0 +1,221 @@
+# services/pipeline.py
+"""
+Building blocks for the streamed LLM -> TTS turn pipeline.
+"""
+import asyncio
+import base64
+import logging
+import re
+import struct
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_BREAK = re.compile(r'(?<=[.?!])\s+')
+
+
+def _speakable(sentence: str) -> bool:
+    # Emoji-only fragments ("😄" after a quick reply) have nothing to synthesize
+    return any(c.isalnum() for c in sentence)
+
+
+class SentenceSplitter:
+    """
+    Cuts streamed LLM text into sentences as soon as each one is complete,
+    so synthesis can start before the rest of the reply has been generated.
+    Fragments with nothing to say (emoji, stray punctuation) are dropped.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Adds a streamed fragment and returns any sentences it completed."""
+        self._buffer += text
+        parts = SENTENCE_BREAK.split(self._buffer)
+        self._buffer = parts.pop()
+        return [p.strip() for p in parts if _speakable(p)]
+
+    def flush(self) -> List[str]:
+        """Returns whatever is left once the stream has ended."""
+        rest = self._buffer.strip()
+        self._buffer = ""
+        return [rest] if _speakable(rest) else []
+
+
+def split_sentences(text: str) -> List[str]:
+    """The sentences a complete text is spoken as (what feed() plus flush() yield)."""
+    splitter = SentenceSplitter()
+    return splitter.feed(text) + splitter.flush()
+
+
+class SynthesisStage:
+    """
+    Dispatches several sentences to TTS at once but delivers their audio
+    strictly in sentence order.
+
+    `synthesize(sentence, emit)` runs the TTS call and hands each audio chunk
+    to `emit` (which may be called from a worker thread). Chunks of the
+    sentence at the head of the queue are forwarded to `deliver(seq, chunk,
+    end)` as they arrive; later sentences are buffered until their turn.
+    Each sentence ends with one `deliver(seq, b"", True)` call.
+
+    Concurrency is bounded by a per-stage (per-session) limit and by a
+    semaphore shared across all sessions. Both are FIFO, so earlier
+    sentences always get a synthesis slot first.
+    """
+
+    def __init__(
+        self,
+        synthesize: Callable[[str, Callable[[bytes], None]], Awaitable[Optional[bytes]]],
+        deliver: Callable[[int, bytes, bool], Awaitable[None]],
+        concurrency: int,
+        global_limit: asyncio.Semaphore,
+    ):
+        self._synthesize = synthesize
+        self._deliver = deliver
+        self._local_limit = asyncio.Semaphore(max(1, concurrency))
+        self._global_limit = global_limit
+        self._pending: asyncio.Queue = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+        self.submitted = 0
+        self._sender = asyncio.create_task(self._send_in_order())
+
+    def submit(self, sentence: str):
+        """Queues a sentence; synthesis starts as soon as a slot is free."""
+        chunks: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(self._run(sentence, chunks))
+        self._tasks.append(task)
+        self._pending.put_nowait((self.submitted, task, chunks))
+        self.submitted += 1
+
+    async def finish(self):
+        """Waits until every submitted sentence has been delivered."""
+        self._pending.put_nowait(None)
+        await self._sender
+
+    def cancel(self):
+        self._sender.cancel()
+        for task in self._tasks:
+            task.cancel()
+
+    async def _run(self, sentence: str, chunks: asyncio.Queue) -> Optional[bytes]:
+        loop = asyncio.get_running_loop()
+
+        def emit(chunk: bytes):
+            loop.call_soon_threadsafe(chunks.put_nowait, chunk)
+
+        try:
+            async with self._local_limit, self._global_limit:
+                return await self._synthesize(sentence, emit)
+        finally:
+            # Chunks emitted from the worker thread are already queued ahead of this
+            chunks.put_nowait(None)
+
+    async def _send_in_order(self):
+        while (item := await self._pending.get()) is not None:
+            seq, task, chunks = item
+            sent = False
+            while (chunk := await chunks.get()) is not None:
+                if chunk:
+                    await self._deliver(seq, chunk, False)
+                    sent = True
+            try:
+                await task
+            except Exception as e:
+                logger.exception("Sentence synthesis failed: %s", e)
+            if sent:
+                await self._deliver(seq, b"", True)
+
+
+# ---------------- AUDIO FRAMES ----------------
+# Binary audio frame: version, flags, turn id, sentence sequence number, then
+# the raw audio bytes. A frame with AUDIO_FLAG_END closes the sentence.
+AUDIO_FRAME_HEADER = struct.Struct("!BBII")
+AUDIO_FRAME_VERSION = 1
+AUDIO_FLAG_END = 0x01
+
+AUDIO_PROTOCOLS = ("json", "binary")
+
+
+def pack_audio_frame(turn_id: int, seq: int, payload: bytes, end: bool = False) -> bytes:
+    flags = AUDIO_FLAG_END if end else 0
+    header = AUDIO_FRAME_HEADER.pack(AUDIO_FRAME_VERSION, flags, turn_id & 0xFFFFFFFF, seq & 0xFFFFFFFF)
+    return header + payload
+
+
+class AudioSink:
+    """
+    Sends one turn's audio to the client in the negotiated protocol:
+    "binary" forwards every chunk as a binary frame as soon as it arrives;
+    "json" (legacy clients) sends each complete sentence base64-encoded.
+    """
+
+    def __init__(self, websocket, protocol: str, turn_id: int, on_first_audio: Optional[Callable[[], None]] = None):
+        self.websocket = websocket
+        self.protocol = protocol
+        self.turn_id = turn_id
+        self.on_first_audio = on_first_audio
+        self._buffers: Dict[int, List[bytes]] = {}
+
+    def _first_audio(self):
+        if self.on_first_audio is not None:
+            self.on_first_audio()
+            self.on_first_audio = None
+
+    async def __call__(self, seq: int, chunk: bytes, end: bool):
+        if self.protocol == "binary":
+            if chunk:
+                self._first_audio()
+            await self.websocket.send_bytes(pack_audio_frame(self.turn_id, seq, chunk, end))
+            return
+        buffer = self._buffers.setdefault(seq, [])
+        if chunk:
+            buffer.append(chunk)
+        if end:
+            audio = b"".join(self._buffers.pop(seq))
+            if audio:
+                self._first_audio()
+                b64_audio = base64.b64encode(audio).decode('utf-8')
+                await self.websocket.send_json({"type": "audio", "b64": b64_audio, "turn_id": self.turn_id})
+
+    async def send_clip(self, seq: int, audio: bytes):
+        """Sends a complete, already synthesized clip as one sentence."""
+        await self(seq, audio, False)
+        await self(seq, b"", True)
+
+
+# ---------------- TURNS ----------------
+class TurnManager:
+    """
+    Runs at most one turn per session. Starting a new turn (the user spoke
+    again mid-answer) cancels the one in flight: its asyncio task is
+    cancelled and its threading.Event is set so blocking upstream calls
+    running in worker threads can abort their streams. Turns are numbered
+    so the client can drop late audio of an interrupted one.
+    """
+
+    def __init__(self, on_interrupt: Callable[[int], Awaitable[None]]):
+        self._on_interrupt = on_interrupt
+        self._task: Optional[asyncio.Task] = None
+        self._cancel_event: Optional[threading.Event] = None
+        self._lock = asyncio.Lock()
+        self.turn_id = 0
+
+    async def start(self, run: Callable[[int, threading.Event], Awaitable[None]]) -> asyncio.Task:
+        async with self._lock:
+            if self.cancel():
+                await self._on_interrupt(self.turn_id)
+            self.turn_id += 1
+            self._cancel_event = threading.Event()
+            self._task = asyncio.create_task(run(self.turn_id, self._cancel_event))
+            return self._task
+
+    def cancel(self) -> bool:
+        """Cancels the turn in flight; returns True if there was one."""
+        if self._task is None or self._task.done():
+            return False
+        self._cancel_event.set()
+        self._task.cancel()
+        return True
@@ -0,0 +1,135 @@
+# services/prefetch.py
+"""
+Speculative news/web fetches from partial transcripts.
+
+While the user is still speaking, AssemblyAI's partial transcripts go
+through the intent router. Once a partial that asks for news or web data
+has pointed at the same lookup for `debounce` seconds, that NewsAPI/SerpAPI
+call starts on the upstream executor. Its result lands in the shared
+news/search cache (and single-flight map), so when the final transcript
+asks the same thing the turn's own fetch is a cache hit or joins the call
+still in flight. Lookups the final transcript doesn't ask for are never
+used and just age out of the cache.
+
+Every started prefetch is counted as a hit or as waste once the turn's
+final transcript arrives (metrics.prefetches_total and per-session stats).
+"""
+import asyncio
+import logging
+from concurrent.futures import Executor
+from typing import Dict, Hashable, Optional, Tuple
+
+from services import llm, metrics, news, search
+from services.router import INTENT_NEWS, INTENT_WEB
+
+logger = logging.getLogger(__name__)
+
+# A partial ending in one of these is mid-phrase ("weather in ...") and its
+# lookup would almost certainly change with the next word.
+DANGLING_WORDS = frozenset((
+    "a", "an", "the", "in", "on", "at", "for", "of", "about", "to", "from", "with", "and", "or", "my", "is",
+))
+
+
+class SpeculativePrefetcher:
+    """
+    One per WebSocket session. on_partial() and resolve() may be called from
+    any thread (they are the AssemblyAI callbacks); the bookkeeping runs on
+    `loop`, in the order the transcripts arrived.
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        executor: Executor,
+        api_keys: Dict[str, str],
+        persona: str = "me",
+        debounce: float = 0.7,
+        min_words: int = 2,
+    ):
+        self._loop = loop
+        self._executor = executor
+        self._api_keys = api_keys
+        self.persona = persona
+        self.debounce = debounce
+        self.min_words = min_words
+        self._pending: Optional[asyncio.TimerHandle] = None
+        self._pending_key: Optional[Hashable] = None
+        # Lookups started for the utterance in progress -> intent
+        self._started: Dict[Hashable, str] = {}
+        self.stats: Dict[str, int] = {"started": 0, "hits": 0, "wasted": 0}
+
+    def lookup(self, text: str) -> Optional[Tuple[str, Hashable]]:
+        """(intent, cache key) of the news/web fetch a transcript leads to, or None."""
+        intent = llm.route(text, self.persona).intent
+        if intent == INTENT_NEWS and self._api_keys.get("newsapi"):
+            return intent, (INTENT_NEWS, news.request_key(text))
+        if intent == INTENT_WEB and self._api_keys.get("serpapi"):
+            return intent, (INTENT_WEB, search.normalize_query(text))
+        return None
+
+    def on_partial(self, text: str):
+        self._loop.call_soon_threadsafe(self._on_partial, text)
+
+    def resolve(self, text: str):
+        """Settles the utterance's prefetches against its final transcript."""
+        self._loop.call_soon_threadsafe(self._resolve, text)
+
+    def close(self):
+        """Drops a pending prefetch; unresolved ones count as waste. Call on the loop."""
+        self._cancel_pending()
+        self._settle(None)
+
+    def _on_partial(self, text: str):
+        words = text.lower().rstrip(".,!?").split()
+        if len(words) < self.min_words or words[-1] in DANGLING_WORDS:
+            return
+        found = self.lookup(text)
+        key = found[1] if found else None
+        if key == self._pending_key:
+            return  # same lookup as the one already waiting out the debounce
+        self._cancel_pending()
+        if found is None or key in self._started:
+            return
+        self._pending_key = key
+        self._pending = self._loop.call_later(self.debounce, self._start, found[0], key, text)
+
+    def _start(self, intent: str, key: Hashable, text: str):
+        self._pending = self._pending_key = None
+        self._started[key] = intent
+        self.stats["started"] += 1
+        logger.debug("Prefetching %s for partial transcript: %s", intent, text)
+        try:
+            self._loop.run_in_executor(self._executor, self._fetch, intent, text)
+        except RuntimeError:
+            pass  # executor shut down
+
+    def _fetch(self, intent: str, text: str):
+        try:
+            if intent == INTENT_NEWS:
+                news.get_news_response(text, self._api_keys.get("newsapi"))
+            else:
+                search.search_snippets(text, self._api_keys.get("serpapi"))
+        except Exception as e:
+            logger.info("Speculative %s fetch failed: %s", intent, e)
+
+    def _resolve(self, text: str):
+        self._cancel_pending()
+        found = self.lookup(text)
+        self._settle(found[1] if found else None)
+
+    def _settle(self, used_key: Optional[Hashable]):
+        hit = used_key is not None and used_key in self._started
+        wasted = len(self._started) - hit
+        self._started.clear()
+        if hit:
+            self.stats["hits"] += 1
+            metrics.prefetches_total.inc(outcome="hit")
+        if wasted:
+            self.stats["wasted"] += wasted
+            metrics.prefetches_total.inc(wasted, outcome="wasted")
+
+    def _cancel_pending(self):
+        if self._pending is not None:
+            self._pending.cancel()
+        self._pending = self._pending_key = None
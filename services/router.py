@@ -0,0 +1,141 @@
+# services/router.py
+"""
+Intent routing for transcripts.
+
+All rules are compiled once into a single alternation regex with word
+boundaries, so routing a turn is one scan of the text. When several rules
+match, the highest priority wins (news beats web search). When every
+phrase starts with a plain character, a lookahead on those characters
+lets the scan skip word starts no rule can match without trying each
+alternative. Quick replies are exact-phrase lookups in per-persona tables
+built up front.
+"""
+import json
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+INTENT_QUICK = "quick"
+INTENT_NEWS = "news"
+INTENT_WEB = "web"
+INTENT_CHAT = "chat"
+
+
+class Rule(NamedTuple):
+    name: str
+    intent: str
+    priority: int
+    phrases: List[str]  # regex fragments, matched on word boundaries
+
+
+class Route(NamedTuple):
+    intent: str
+    rule: Optional[str] = None
+    reply: Optional[str] = None  # canned text for INTENT_QUICK
+
+
+DEFAULT_RULES = [
+    Rule("news", INTENT_NEWS, 30, [
+        r"news", r"headlines?", r"what'?s happening", r"current events", r"breaking (?:news|stories)",
+    ]),
+    Rule("weather", INTENT_WEB, 20, [
+        r"weather", r"temperature", r"forecast", r"umbrella",
+        r"is it (?:rain|snow)(?:ing)?", r"will it (?:rain|snow)", r"going to (?:rain|snow)", r"gonna (?:rain|snow)",
+    ]),
+    Rule("live_data", INTENT_WEB, 20, [
+        r"scores?", r"who won", r"price of", r"stock price", r"exchange rate",
+        r"time in", r"time is it in",
+    ]),
+    Rule("facts", INTENT_WEB, 10, [
+        r"who is", r"who was", r"population", r"latest",
+        r"what is the (?:weather|temperature|price|population|score|time)",
+    ]),
+]
+
+
+def _branches(phrase: str) -> List[str]:
+    """Splits a phrase on its top-level `|` (not inside a group, a class or after a backslash)."""
+    branches, start, depth, in_class, escaped = [], 0, 0, False, False
+    for i, c in enumerate(phrase):
+        if escaped:
+            escaped = False
+        elif c == "\\":
+            escaped = True
+        elif in_class:
+            in_class = c != "]"
+        elif c == "[":
+            in_class = True
+        elif c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+        elif c == "|" and depth == 0:
+            branches.append(phrase[start:i])
+            start = i + 1
+    branches.append(phrase[start:])
+    return branches
+
+
+def _first_chars(phrases: Iterable[str]) -> Optional[str]:
+    """The characters every phrase starts with, or None if one starts with a regex construct."""
+    chars = set()
+    for branch in (b for phrase in phrases for b in _branches(phrase)):
+        if not branch or not branch[0].isalnum() or branch[1:2] in ("?", "*", "{"):
+            return None
+        chars.add(branch[0])
+    return "".join(sorted(chars))
+
+
+def normalize(text: str) -> str:
+    """Lowercases, collapses whitespace and drops trailing punctuation."""
+    return " ".join(text.lower().split()).rstrip(".!?,")
+
+
+class Router:
+    """Routes a transcript to a quick reply, news, web search or plain chat."""
+
+    def __init__(self, rules: Iterable[Rule] = DEFAULT_RULES, quick_replies: Optional[Dict[str, Dict[str, str]]] = None):
+        self.rules = sorted(rules, key=lambda r: -r.priority)
+        self.quick_replies = quick_replies or {}
+        # Longest quick-reply phrase (plus slack for spacing/punctuation): longer
+        # transcripts can skip the table lookup entirely.
+        self._max_quick_len = max((len(p) for t in self.quick_replies.values() for p in t), default=0) + 8
+        alternatives = [rf"(?P<r{i}>{'|'.join(rule.phrases)})" for i, rule in enumerate(self.rules)]
+        first = _first_chars(p for rule in self.rules for p in rule.phrases)
+        gate = rf"(?=[{first}])" if first else ""
+        self._pattern = re.compile(rf"\b{gate}(?:{'|'.join(alternatives)})\b") if alternatives else None
+
+    @classmethod
+    def from_file(cls, path: str, quick_replies: Optional[Dict[str, Dict[str, str]]] = None) -> "Router":
+        """Loads rules from a JSON list of {name, intent, priority, phrases} objects."""
+        with open(path, encoding="utf-8") as f:
+            rules = [Rule(r["name"], r["intent"], int(r["priority"]), list(r["phrases"])) for r in json.load(f)]
+        return cls(rules, quick_replies)
+
+    def quick_reply(self, text: str, persona: str = "me") -> Optional[str]:
+        if len(text) > self._max_quick_len:
+            return None
+        table = self.quick_replies.get(persona) or self.quick_replies.get("me", {})
+        return table.get(normalize(text))
+
+    def route(self, text: str, persona: str = "me") -> Route:
+        reply = self.quick_reply(text, persona)
+        if reply is not None:
+            return Route(INTENT_QUICK, reply=reply)
+        if self._pattern is None:
+            return Route(INTENT_CHAT)
+        text = text.lower()
+        match = self._pattern.search(text)
+        if match is None:
+            return Route(INTENT_CHAT)
+        best = int(match.lastgroup[1:])
+        # Rules are sorted by priority, so the lowest index wins; later
+        # matches only matter if they can beat the first one
+        if best:
+            for match in self._pattern.finditer(text, match.end()):
+                index = int(match.lastgroup[1:])
+                if index < best:
+                    best = index
+                    if best == 0:
+                        break
+        rule = self.rules[best]
+        return Route(rule.intent, rule=rule.name)
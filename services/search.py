@@ -0,0 +1,97 @@
+# services/search.py
+"""
+Cached, deduplicated SerpAPI web search.
+
+Only the trimmed top snippets the LLM actually uses are cached, keyed on the
+normalized query text, with a TTL chosen by what kind of question it is.
+The query sent to SerpAPI is the original one (the first asker's wording
+when identical lookups coalesce).
+"""
+import logging
+import re
+from typing import Any, Dict, List, Tuple
+
+from services import admission, metrics
+from services.cache import TTLCache, SingleFlight
+from config import SEARCH_CACHE_MAX_ENTRIES, FETCH_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+MAX_SNIPPETS = 3
+
+# (pattern, ttl seconds) -- first match wins. Live data gets a short TTL,
+# slow-changing facts a long one.
+SEARCH_TTLS: List[Tuple[re.Pattern, float]] = [
+    (re.compile(r"\b(score|scores|live|match)\b"), 60),
+    (re.compile(r"\btime in\b"), 30),
+    (re.compile(r"\b(weather|temperature|forecast|rain)\b"), 600),
+    (re.compile(r"\b(price|stock|rate)\b"), 300),
+    (re.compile(r"\b(news|latest|today|tomorrow)\b"), 300),
+    (re.compile(r"\b(who is|who was|population|capital|born|founded)\b"), 24 * 3600),
+]
+DEFAULT_SEARCH_TTL = 3600
+
+_cache = TTLCache(DEFAULT_SEARCH_TTL, SEARCH_CACHE_MAX_ENTRIES)
+_flight = SingleFlight()
+
+def normalize_query(query: str) -> str:
+    """Lowercases, drops punctuation (keeping apostrophes) and collapses whitespace."""
+    return " ".join(re.sub(r"[^\w\s']", " ", query.lower()).split())
+
+def ttl_for(normalized_query: str) -> float:
+    for pattern, ttl in SEARCH_TTLS:
+        if pattern.search(normalized_query):
+            return ttl
+    return DEFAULT_SEARCH_TTL
+
+def _google_search(params: Dict[str, Any]) -> Dict[str, Any]:
+    from serpapi import GoogleSearch  # imported on first search (see warm_up)
+    client = GoogleSearch(params)
+    client.timeout = FETCH_TIMEOUT_SECONDS  # the SDK default is 60000 (seconds)
+    return client.get_dict()
+
+def warm_up():
+    """Loads the SerpAPI client ahead of the first search."""
+    import serpapi  # noqa: F401
+
+def _fetch(query: str, api_key: str) -> Tuple[str, ...]:
+    try:
+        with admission.admit("serpapi", api_key):
+            results = _google_search({"q": query, "api_key": api_key, "engine": "google"})
+            error = results.get("error")
+            # "Google hasn't returned any results for this query." is an empty result, not an outage
+            if error and "organic_results" not in results and "returned any results" not in error:
+                raise RuntimeError(f"SerpAPI error: {error}")
+    except admission.AdmissionError:
+        raise
+    except Exception:
+        metrics.upstream_error("serpapi")
+        raise
+    return tuple(r.get("snippet", "") for r in results.get("organic_results", [])[:MAX_SNIPPETS])
+
+def search_snippets(query: str, api_key: str) -> List[str]:
+    """
+    Returns up to MAX_SNIPPETS result snippets for the query (empty if
+    nothing was found). Raises if SerpAPI fails or the call is refused
+    (admission.AdmissionError); failures are not cached.
+    """
+    normalized = normalize_query(query)
+    cached = _cache.get(normalized)
+    if cached is not None:
+        metrics.cache_requests_total.inc(cache="search", outcome="hit")
+        return list(cached)
+
+    fetched = []
+
+    def fetch_and_store() -> Tuple[str, ...]:
+        fetched.append(True)
+        # The normalized text is only the cache key; SerpAPI gets the query as asked
+        snippets = _fetch(query, api_key)
+        _cache.put(normalized, snippets, ttl=ttl_for(normalized))
+        return snippets
+
+    # Concurrent identical lookups share a single upstream call
+    try:
+        return list(_flight.do(normalized, fetch_and_store))
+    finally:
+        metrics.cache_requests_total.inc(cache="search", outcome="miss" if fetched else "coalesced")
@@ -0,0 +1,249 @@
+# services/sessions.py
+"""
+Resumable conversation sessions.
+
+A client that sends the config handshake gets a session token in
+config_ack; sending it back in a later handshake (after a dropped socket,
+or to another worker) resumes the conversation. What a session needs to
+resume is its persona and its turns, so that is all the store keeps: one
+compact (question, answer) row appended per turn, never a rewrite of the
+whole history. The Gemini chat of a resumed session is rebuilt from its
+last turns (see llm.ChatRegistry). API keys are never stored; clients send
+them with every handshake.
+
+Backends, chosen by SESSION_STORE:
+
+  memory                       this process only (the default)
+  sqlite:///path/sessions.db   a SQLite file shared by every worker on the host
+
+Sessions idle for longer than SESSION_TTL_SECONDS are forgotten.
+"""
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config import SESSION_STORE, SESSION_TTL_SECONDS, SESSION_RESUME_TURNS
+
+logger = logging.getLogger(__name__)
+
+
+def new_token() -> str:
+    return secrets.token_urlsafe(18)
+
+
+def _as_messages(turns: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+    messages: List[Dict[str, Any]] = []
+    for user_text, model_text in turns:
+        messages.append({"role": "user", "parts": [user_text]})
+        messages.append({"role": "model", "parts": [model_text]})
+    return messages
+
+
+class SessionStore(ABC):
+    """
+    Interface of the session backends. Every method may block (disk I/O)
+    and is safe to call from executor threads.
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL_SECONDS, max_turns: int = SESSION_RESUME_TURNS):
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.stats: Dict[str, int] = {"created": 0, "resumed": 0, "appended": 0}
+
+    @abstractmethod
+    def create(self, persona: str) -> str:
+        """Starts a new session; returns its token."""
+
+    @abstractmethod
+    def resume(self, token: str, persona: str) -> bool:
+        """True if the token names a live session (its persona is updated); False if unknown or expired."""
+
+    @abstractmethod
+    def history(self, token: str) -> List[Dict[str, Any]]:
+        """The session's last max_turns turns as {"role", "parts"} messages, oldest first."""
+
+    @abstractmethod
+    def append(self, token: str, user_text: str, model_text: str):
+        """Records one turn. Unknown tokens are ignored."""
+
+    def close(self):
+        pass
+
+
+# ---------------- MEMORY ----------------
+class _MemorySession:
+    __slots__ = ("persona", "updated", "turns")
+
+    def __init__(self, persona: str, max_turns: int):
+        self.persona = persona
+        self.updated = time.time()
+        self.turns: Deque[Tuple[str, str]] = deque(maxlen=max_turns)
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions in this process's memory; only turns that can still be resumed are kept."""
+
+    def __init__(self, ttl: float = SESSION_TTL_SECONDS, max_turns: int = SESSION_RESUME_TURNS):
+        super().__init__(ttl, max_turns)
+        self._sessions: Dict[str, _MemorySession] = {}
+        self._lock = threading.Lock()
+
+    def create(self, persona: str) -> str:
+        token = new_token()
+        with self._lock:
+            self._expire(time.time())
+            self._sessions[token] = _MemorySession(persona, self.max_turns)
+            self.stats["created"] += 1
+        return token
+
+    def resume(self, token: str, persona: str) -> bool:
+        with self._lock:
+            session = self._live(token)
+            if session is None:
+                return False
+            session.persona = persona
+            session.updated = time.time()
+            self.stats["resumed"] += 1
+            return True
+
+    def history(self, token: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            session = self._live(token)
+            return _as_messages(list(session.turns)) if session else []
+
+    def append(self, token: str, user_text: str, model_text: str):
+        with self._lock:
+            session = self._live(token)
+            if session is None:
+                return
+            session.turns.append((user_text, model_text))
+            session.updated = time.time()
+            self.stats["appended"] += 1
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _live(self, token: str) -> Optional[_MemorySession]:
+        session = self._sessions.get(token)
+        if session is not None and time.time() - session.updated > self.ttl:
+            del self._sessions[token]
+            return None
+        return session
+
+    def _expire(self, now: float):
+        for token in [t for t, s in self._sessions.items() if now - s.updated > self.ttl]:
+            del self._sessions[token]
+
+
+# ---------------- SQLITE ----------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    token TEXT PRIMARY KEY,
+    persona TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated);
+CREATE TABLE IF NOT EXISTS turns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    token TEXT NOT NULL,
+    user_text TEXT NOT NULL,
+    model_text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_token ON turns (token, id);
+"""
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Sessions in a SQLite file. WAL mode lets several worker processes read
+    and append concurrently; a turn costs one INSERT plus an UPDATE of the
+    session's timestamp, and prunes the session's turns beyond the last
+    max_turns in the same transaction.
+    """
+
+    def __init__(self, path: str, ttl: float = SESSION_TTL_SECONDS, max_turns: int = SESSION_RESUME_TURNS):
+        super().__init__(ttl, max_turns)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def create(self, persona: str) -> str:
+        token = new_token()
+        now = time.time()
+        with self._lock, self._db:
+            self._expire(now)
+            self._db.execute("INSERT INTO sessions (token, persona, updated) VALUES (?, ?, ?)", (token, persona, now))
+            self.stats["created"] += 1
+        return token
+
+    def resume(self, token: str, persona: str) -> bool:
+        now = time.time()
+        with self._lock, self._db:
+            resumed = self._db.execute(
+                "UPDATE sessions SET persona = ?, updated = ? WHERE token = ? AND updated >= ?",
+                (persona, now, token, now - self.ttl),
+            ).rowcount
+            if not resumed:
+                return False
+            self._prune(token)
+            self.stats["resumed"] += 1
+            return True
+
+    def history(self, token: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT user_text, model_text FROM turns WHERE token = ? AND EXISTS "
+                "(SELECT 1 FROM sessions WHERE token = ? AND updated >= ?) ORDER BY id DESC LIMIT ?",
+                (token, token, time.time() - self.ttl, self.max_turns),
+            ).fetchall()
+        return _as_messages(rows[::-1])
+
+    def append(self, token: str, user_text: str, model_text: str):
+        with self._lock, self._db:
+            known = self._db.execute("UPDATE sessions SET updated = ? WHERE token = ?", (time.time(), token)).rowcount
+            if not known:
+                return
+            self._db.execute(
+                "INSERT INTO turns (token, user_text, model_text) VALUES (?, ?, ?)", (token, user_text, model_text)
+            )
+            self._prune(token)
+            self.stats["appended"] += 1
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _prune(self, token: str):
+        self._db.execute(
+            "DELETE FROM turns WHERE token = ? AND id NOT IN "
+            "(SELECT id FROM turns WHERE token = ? ORDER BY id DESC LIMIT ?)",
+            (token, token, self.max_turns),
+        )
+
+    def _expire(self, now: float):
+        cutoff = now - self.ttl
+        self._db.execute("DELETE FROM turns WHERE token IN (SELECT token FROM sessions WHERE updated < ?)", (cutoff,))
+        self._db.execute("DELETE FROM sessions WHERE updated < ?", (cutoff,))
+
+
+def open_store(url: str) -> SessionStore:
+    """A store for a SESSION_STORE value ("memory" or "sqlite:///path")."""
+    if url.startswith("sqlite://"):
+        path = url[len("sqlite://"):]
+        return SQLiteSessionStore(path[1:] if path.startswith("/") else path)
+    if url != "memory":
+        logger.warning("Unknown SESSION_STORE %r; keeping sessions in memory.", url)
+    return MemorySessionStore()
+
+
+store = open_store(SESSION_STORE)
@@ -1,25 +1,55 @@
 # services/stt.py
-import assemblyai as aai
-from assemblyai.streaming.v3 import (
-    StreamingClient,
-    StreamingClientOptions,
-    StreamingParameters,
-    StreamingSessionParameters,
-    StreamingEvents,
-    BeginEvent,
-    TurnEvent,
-    TerminationEvent,
-    StreamingError,
-)
-
-def _on_begin(client: StreamingClient, event: BeginEvent):
-    print(f"AAI session started: {event.id}")
-
-def _on_termination(client: StreamingClient, event: TerminationEvent):
-    print(f"AAI session terminated after {event.audio_duration_seconds} s")
-
-def _on_error(client: StreamingClient, error: StreamingError):
-    print("AAI error:", error)
+import functools
+import logging
+import math
+import queue
+import threading
+import time
+import warnings
+from array import array
+from collections import deque
+from typing import TYPE_CHECKING, Callable, Deque, Dict, List, Optional, Tuple
+
+from services import admission, metrics
+from config import ASSEMBLYAI_API_KEY, STT_CONNECT_TIMEOUT_SECONDS
+
+if TYPE_CHECKING:
+    from assemblyai.streaming.v3 import StreamingClient, BeginEvent, TurnEvent, TerminationEvent, StreamingError
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop  # C-speed RMS; deprecated and removed in Python 3.13
+    except ImportError:
+        audioop = None
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_WIDTH = 2  # 16-bit PCM
+MIN_CHUNK_MS = 50  # AssemblyAI v3 rejects shorter audio messages
+
+@functools.lru_cache(maxsize=None)
+def _sdk():
+    """Imports and configures the AssemblyAI streaming SDK once, on first use."""
+    import assemblyai as aai
+    import assemblyai.streaming.v3 as streaming
+    if ASSEMBLYAI_API_KEY:
+        aai.settings.api_key = ASSEMBLYAI_API_KEY
+    return streaming
+
+def warm_up():
+    """Loads the AssemblyAI SDK ahead of the first session."""
+    _sdk()
+
+def _on_begin(client: "StreamingClient", event: "BeginEvent"):
+    logger.info("AAI session started: %s", event.id)
+
+def _on_termination(client: "StreamingClient", event: "TerminationEvent"):
+    logger.info("AAI session terminated after %s s", event.audio_duration_seconds)
+
+def _on_error(client: "StreamingClient", error: "StreamingError"):
+    logger.error("AAI error: %s", error)
+    metrics.upstream_error("assemblyai")
 
 class AssemblyAIStreamingTranscriber:
     """
@@ -37,63 +67,427 @@ class AssemblyAIStreamingTranscriber:
     ):
         self.on_partial_callback = on_partial_callback
         self.on_final_callback = on_final_callback
+        # Audio time (ms) at which the last finalized turn's last word ended
+        self.last_word_end_ms: Optional[int] = None
+        # Pool bookkeeping: a session that heard audio can't be handed to another user
+        self.used = False
+        self.healthy = True
 
+        sdk = _sdk()
         # It's okay if api_key is None; AssemblyAI SDK may read from env as fallback
-        self.client = StreamingClient(
-            StreamingClientOptions(
+        self.client = sdk.StreamingClient(
+            sdk.StreamingClientOptions(
                 api_key=api_key,
                 api_host="streaming.assemblyai.com",
+                connect_timeout=STT_CONNECT_TIMEOUT_SECONDS,
             )
         )
 
         # register events
-        self.client.on(StreamingEvents.Begin, _on_begin)
-        self.client.on(StreamingEvents.Error, _on_error)
-        self.client.on(StreamingEvents.Termination, _on_termination)
+        self.client.on(sdk.StreamingEvents.Begin, _on_begin)
+        self.client.on(sdk.StreamingEvents.Error, self._on_error)
+        self.client.on(sdk.StreamingEvents.Termination, self._on_termination)
         self.client.on(
-            StreamingEvents.Turn,
+            sdk.StreamingEvents.Turn,
             lambda client, event: self._on_turn(client, event),
         )
 
         self.client.connect(
-            StreamingParameters(
+            sdk.StreamingParameters(
                 sample_rate=sample_rate,
                 format_turns=False,
             )
         )
 
-    def _on_turn(self, client: StreamingClient, event: TurnEvent):
+    def _on_error(self, client: "StreamingClient", error: "StreamingError"):
+        # connect() reports handshake failures here instead of raising
+        self.healthy = False
+        _on_error(client, error)
+
+    def _on_termination(self, client: "StreamingClient", event: "TerminationEvent"):
+        self.healthy = False
+        _on_termination(client, event)
+
+    def _on_turn(self, client: "StreamingClient", event: "TurnEvent"):
         text = (event.transcript or "").strip()
         if not text:
             return
 
         if event.end_of_turn:
+            if event.words:
+                self.last_word_end_ms = event.words[-1].end
             if self.on_final_callback:
                 try:
                     self.on_final_callback(text)
                 except Exception as e:
-                    print("on_final_callback error:", e)
+                    logger.exception("on_final_callback error: %s", e)
 
             if not event.turn_is_formatted:
                 try:
-                    client.set_params(StreamingSessionParameters(format_turns=True))
+                    client.set_params(_sdk().StreamingSessionParameters(format_turns=True))
                 except Exception as set_err:
-                    print("set_params error:", set_err)
+                    logger.warning("set_params error: %s", set_err)
         else:
             if self.on_partial_callback:
                 try:
                     self.on_partial_callback(text)
                 except Exception as e:
-                    print("on_partial_callback error:", e)
+                    logger.exception("on_partial_callback error: %s", e)
 
     def stream_audio(self, audio_chunk: bytes):
+        """Sends PCM to AssemblyAI; raises on failure so callers can count/handle it."""
+        self.used = True
+        self.client.stream(audio_chunk)
+
+    def keep_alive(self):
+        """Keeps an idle (pooled) session from timing out."""
         try:
-            self.client.stream(audio_chunk)
+            self.client.keep_alive()
         except Exception as e:
-            print("Error streaming audio to AssemblyAI:", e)
+            self.healthy = False
+            logger.warning("AAI keep-alive failed: %s", e)
 
     def close(self):
+        self.healthy = False
         try:
             self.client.disconnect(terminate=True)
         except Exception as e:
-            print("Error disconnecting AAI client:", e)
+            logger.warning("Error disconnecting AAI client: %s", e)
+
+
+# ---------------- SESSION POOL ----------------
+class TranscriberPool:
+    """
+    Warm, pre-connected AssemblyAI sessions for the keys registered with
+    warm() (the server-side key), so a new WebSocket session doesn't pay the
+    TLS + WebSocket handshake before its first audio byte.
+
+    acquire() hands out an idle session (or connects one for unpooled keys
+    or when the pool is drained) and tops the pool back up in the
+    background. release() puts a session that never heard audio back;
+    anything else is terminated and replaced. A reaper thread expires
+    sessions idle longer than idle_ttl, drops unhealthy ones and sends
+    keep-alives to the rest. acquire() blocks while it connects; release()
+    hands used sessions to a closer thread instead of waiting for them to
+    terminate.
+
+    Connects go through admission control: acquire() raises
+    admission.AdmissionError or ConnectionError when no session can be opened.
+    """
+
+    def __init__(self, max_size: int, idle_ttl: float, sample_rate: int = 16000, check_interval: float = 15.0):
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.sample_rate = sample_rate
+        self.check_interval = min(check_interval, idle_ttl / 2) if idle_ttl > 0 else check_interval
+        self._idle: Dict[str, Deque[Tuple[float, AssemblyAIStreamingTranscriber]]] = {}
+        self._connecting: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._reaper: Optional[threading.Thread] = None
+        self.stats: Dict[str, int] = {
+            "hits": 0, "misses": 0, "returned": 0, "recycled": 0, "expired": 0, "unhealthy": 0,
+        }
+
+    def _connect(self, api_key: str) -> AssemblyAIStreamingTranscriber:
+        with admission.admit("assemblyai", api_key):
+            transcriber = AssemblyAIStreamingTranscriber(sample_rate=self.sample_rate, api_key=api_key)
+            if not transcriber.healthy:
+                # The SDK reports a failed handshake as an error event, not an exception
+                transcriber.close()
+                raise ConnectionError("AssemblyAI streaming handshake failed")
+        return transcriber
+
+    def warm(self, api_key: str):
+        """Starts keeping up to max_size idle sessions connected for api_key."""
+        if self.max_size <= 0 or not api_key:
+            return
+        with self._lock:
+            self._idle.setdefault(api_key, deque())
+            self._connecting.setdefault(api_key, 0)
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, name="stt-pool", daemon=True)
+                self._reaper.start()
+        self._refill(api_key)
+
+    def acquire(self, api_key: str, on_final_callback=None, on_partial_callback=None) -> AssemblyAIStreamingTranscriber:
+        transcriber, stale = None, []
+        with self._lock:
+            idle = self._idle.get(api_key)
+            while idle:
+                since, candidate = idle.popleft()
+                if candidate.healthy and time.monotonic() - since < self.idle_ttl:
+                    transcriber = candidate
+                    break
+                stale.append(candidate)
+            self.stats["hits" if transcriber else "misses"] += 1
+        self._discard(stale)
+
+        if transcriber is None:
+            transcriber = self._connect(api_key)
+        transcriber.on_final_callback = on_final_callback
+        transcriber.on_partial_callback = on_partial_callback
+        if api_key in self._idle:
+            self._refill(api_key)
+        return transcriber
+
+    def release(self, transcriber: AssemblyAIStreamingTranscriber, api_key: str):
+        transcriber.on_final_callback = None
+        transcriber.on_partial_callback = None
+        with self._lock:
+            idle = self._idle.get(api_key)
+            if (
+                idle is not None and not self._stop.is_set() and not transcriber.used and transcriber.healthy
+                and len(idle) + self._connecting[api_key] < self.max_size
+            ):
+                idle.append((time.monotonic(), transcriber))
+                self.stats["returned"] += 1
+                return
+            if idle is not None:
+                self.stats["recycled"] += 1
+        self._discard([transcriber])
+        if api_key in self._idle:
+            self._refill(api_key)
+
+    def close(self):
+        """Stops the reaper and closes every idle session."""
+        self._stop.set()
+        with self._lock:
+            idle = [t for sessions in self._idle.values() for _, t in sessions]
+            for sessions in self._idle.values():
+                sessions.clear()
+        for transcriber in idle:
+            transcriber.close()
+
+    def _refill(self, api_key: str):
+        with self._lock:
+            if self._stop.is_set():
+                return
+            missing = self.max_size - len(self._idle[api_key]) - self._connecting[api_key]
+            self._connecting[api_key] += max(missing, 0)
+        for _ in range(missing):
+            threading.Thread(target=self._add, args=(api_key,), name="stt-pool-connect", daemon=True).start()
+
+    def _add(self, api_key: str):
+        try:
+            transcriber = self._connect(api_key)
+        except Exception as e:
+            logger.warning("Could not pre-connect an AssemblyAI session: %s", e)
+            transcriber = None
+        with self._lock:
+            self._connecting[api_key] -= 1
+            keep = transcriber is not None and transcriber.healthy and not self._stop.is_set()
+            if keep:
+                self._idle[api_key].append((time.monotonic(), transcriber))
+        if transcriber is not None and not keep:
+            transcriber.close()
+
+    def _reap_loop(self):
+        while not self._stop.wait(self.check_interval):
+            stale: List[AssemblyAIStreamingTranscriber] = []
+            alive: List[AssemblyAIStreamingTranscriber] = []
+            now = time.monotonic()
+            with self._lock:
+                for sessions in self._idle.values():
+                    for since, transcriber in list(sessions):
+                        if not transcriber.healthy:
+                            self.stats["unhealthy"] += 1
+                        elif now - since >= self.idle_ttl:
+                            self.stats["expired"] += 1
+                        else:
+                            alive.append(transcriber)
+                            continue
+                        sessions.remove((since, transcriber))
+                        stale.append(transcriber)
+                keys = list(self._idle)
+            for transcriber in alive:
+                transcriber.keep_alive()
+            self._discard(stale)
+            for api_key in keys:
+                self._refill(api_key)
+
+    @staticmethod
+    def _discard(transcribers: List[AssemblyAIStreamingTranscriber]):
+        # A graceful terminate can take seconds; never make a caller wait for it
+        def close_all():
+            for transcriber in transcribers:
+                transcriber.close()
+
+        if transcribers:
+            threading.Thread(target=close_all, name="stt-pool-close", daemon=True).start()
+
+
+# ---------------- AUDIO INGESTION ----------------
+def frame_rms(frame: bytes) -> int:
+    """RMS energy of a 16-bit little-endian PCM frame."""
+    frame = frame[:len(frame) - len(frame) % SAMPLE_WIDTH]
+    if not frame:
+        return 0
+    if audioop is not None:
+        return audioop.rms(frame, SAMPLE_WIDTH)
+    samples = array("h")
+    samples.frombytes(frame)
+    return int(math.sqrt(sum(x * x for x in samples) / len(samples)))
+
+
+class AudioIngestor:
+    """
+    Per-session ingestion stage between the WebSocket and AssemblyAI.
+
+    feed() only enqueues (it never blocks the event loop); a dedicated sender
+    thread coalesces frames into chunk_ms-sized chunks (bigger, up to
+    max_chunk_ms, when it falls behind) and streams them upstream. When the
+    bounded queue is full the overflow policy drops the oldest or the newest
+    frame. An optional energy VAD skips silent frames, but keeps a short
+    pre-roll before speech and a hangover after it so AssemblyAI still hears
+    enough trailing silence to detect the end of the turn.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[bytes], None],
+        sample_rate: int = 16000,
+        chunk_ms: int = 100,
+        max_chunk_ms: int = 1000,
+        max_queue_frames: int = 32,
+        overflow_policy: str = "drop_oldest",
+        vad_threshold: int = 0,
+        vad_hangover_ms: int = 1500,
+        vad_preroll_ms: int = 300,
+    ):
+        self._send = send
+        bytes_per_ms = sample_rate * SAMPLE_WIDTH // 1000
+        self.bytes_per_ms = bytes_per_ms
+        self.min_chunk_bytes = MIN_CHUNK_MS * bytes_per_ms
+        self.chunk_bytes = max(chunk_ms, MIN_CHUNK_MS) * bytes_per_ms
+        self.max_chunk_bytes = max(self.chunk_bytes, max_chunk_ms * bytes_per_ms)
+        self.overflow_policy = overflow_policy
+        self.vad_threshold = vad_threshold
+        self.vad_hangover_bytes = vad_hangover_ms * bytes_per_ms
+        self.vad_preroll_bytes = vad_preroll_ms * bytes_per_ms
+        self._flush_interval = chunk_ms / 1000
+
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=max_queue_frames)
+        self._preroll: list = []
+        self._preroll_size = 0
+        self._hangover_left = 0
+        self._closed = False
+
+        self.stats: Dict[str, int] = {
+            "frames_in": 0,
+            "frames_dropped": 0,
+            "frames_silent": 0,
+            "chunks_sent": 0,
+            "bytes_sent": 0,
+            "send_errors": 0,
+        }
+        self._sender = threading.Thread(target=self._run, name="stt-ingest", daemon=True)
+        self._sender.start()
+
+    @property
+    def audio_ms_sent(self) -> float:
+        """Audio time streamed upstream so far (AssemblyAI's clock; skipped silence excluded)."""
+        return self.stats["bytes_sent"] / self.bytes_per_ms
+
+    # -- event loop side --
+    def feed(self, frame: bytes) -> bool:
+        """Enqueues a PCM frame; returns False if a frame had to be dropped."""
+        if self._closed or not frame:
+            return True
+        self.stats["frames_in"] += 1
+        try:
+            self._queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            pass
+        self.stats["frames_dropped"] += 1
+        if self.overflow_policy == "drop_oldest":
+            try:
+                self._queue.get_nowait()
+                self._queue.put_nowait(frame)
+            except (queue.Empty, queue.Full):
+                pass
+        return False
+
+    def close(self, timeout: float = 2.0):
+        """Flushes what is buffered and stops the sender thread."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._sender.join(timeout)
+
+    # -- sender thread --
+    def _run(self):
+        buffer = bytearray()
+        last_send = time.monotonic()
+        while True:
+            try:
+                frame = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                frame = b""
+            if frame is None:
+                if buffer:
+                    # Pad the tail with silence rather than send a too-short message
+                    buffer.extend(bytes(max(0, self.min_chunk_bytes - len(buffer))))
+                    self._emit(bytes(buffer))
+                return
+
+            if frame:
+                buffer += self._gate(frame)
+                # Behind? Coalesce whatever is already queued into one bigger chunk
+                while len(buffer) < self.max_chunk_bytes:
+                    try:
+                        more = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if more is None:
+                        self._queue.put_nowait(None)
+                        break
+                    buffer += self._gate(more)
+
+            now = time.monotonic()
+            ready = len(buffer) >= self.chunk_bytes
+            # A stale flush waits for the 50 ms AssemblyAI accepts; shorter remainders stay buffered
+            stale = len(buffer) >= self.min_chunk_bytes and now - last_send >= self._flush_interval
+            if ready or stale:
+                size = min(len(buffer), self.max_chunk_bytes)
+                size -= size % SAMPLE_WIDTH
+                if size:
+                    self._emit(bytes(buffer[:size]))
+                    del buffer[:size]
+                    last_send = now
+
+    def _gate(self, frame: bytes) -> bytes:
+        """Energy VAD: returns the audio worth sending upstream for this frame."""
+        if self.vad_threshold <= 0:
+            return frame
+        if frame_rms(frame) >= self.vad_threshold:
+            self._hangover_left = self.vad_hangover_bytes
+            out = b"".join(self._preroll) + frame
+            self._preroll.clear()
+            self._preroll_size = 0
+            return out
+        if self._hangover_left > 0:
+            self._hangover_left -= len(frame)
+            return frame
+        self.stats["frames_silent"] += 1
+        self._preroll.append(frame)
+        self._preroll_size += len(frame)
+        while self._preroll and self._preroll_size - len(self._preroll[0]) >= self.vad_preroll_bytes:
+            self._preroll_size -= len(self._preroll.pop(0))
+        return b""
+
+    def _emit(self, chunk: bytes):
+        try:
+            self._send(chunk)
+            self.stats["chunks_sent"] += 1
+            self.stats["bytes_sent"] += len(chunk)
+        except Exception as e:
+            self.stats["send_errors"] += 1
+            metrics.upstream_error("assemblyai")
+            if self.stats["send_errors"] == 1 or self.stats["send_errors"] % 100 == 0:
+                logger.warning("Error streaming audio to AssemblyAI (%d so far): %s", self.stats["send_errors"], e)
@@ -1,60 +1,278 @@
 # services/tts.py
-import requests
-from typing import List, Dict, Any
-from murf import Murf
+import httpx
+from typing import TYPE_CHECKING, Callable, List, Dict, Iterable, Optional
 from pathlib import Path
+from collections import OrderedDict
+import functools
+import hashlib
 import logging
 import os
+import threading
+import time
+
+from services import admission, metrics
+from services.cache import LRUCache
+from config import (
+    TTS_CACHE_MEMORY_BYTES, TTS_CACHE_DISK_BYTES, TTS_CACHE_DIR,
+    TTS_GLOBAL_CONCURRENCY, TTS_TIMEOUT_SECONDS, TTS_KEEPALIVE_SECONDS,
+)
+
+if TYPE_CHECKING:
+    from murf import Murf
 
 logger = logging.getLogger(__name__)
 
 MURF_API_URL = "https://api.murf.ai/v1/speech"
+DEFAULT_VOICE_ID = "en-IN-priya"
+DEFAULT_STYLE = "Conversational"
 
 # Ensure uploads folder exists (two levels up -> project root / uploads)
 UPLOADS_DIR = Path(__file__).resolve().parent.parent / "uploads"
 UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
 
-def speak(text: str, api_key: str, output_file: str = "stream_output.wav", voice_id: str = "en-IN-priya"):
+# ---------------- AUDIO CACHE ----------------
+class AudioCache:
     """
-    Convert text to speech using Murf API and save audio in uploads folder.
+    Content-addressed two-tier cache for synthesized speech, keyed by
+    (text, voice_id, style): an in-memory LRU in front of a size-bounded
+    directory of audio files (oldest-used files are evicted first).
+    """
+
+    def __init__(self, memory_bytes: int, disk_bytes: int, directory: Path):
+        self.memory = LRUCache(memory_bytes, sizeof=len)
+        self.disk_bytes = disk_bytes
+        self.directory = directory
+        self._disk_index: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._load_index()
+
+    @staticmethod
+    def key(text: str, voice_id: str, style: str) -> str:
+        return hashlib.sha256(f"{voice_id}\0{style}\0{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str, voice_id: str, style: str) -> Optional[bytes]:
+        key = self.key(text, voice_id, style)
+        audio = self.memory.get(key)
+        if audio is None:
+            audio = self._read_disk(key)
+            if audio is not None:
+                self.memory.put(key, audio)
+        if audio is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return audio
+
+    def put(self, text: str, voice_id: str, style: str, audio: bytes):
+        key = self.key(text, voice_id, style)
+        self.memory.put(key, audio)
+        self._write_disk(key, audio)
+
+    def __contains__(self, entry) -> bool:
+        key = self.key(*entry)
+        with self._lock:
+            return key in self.memory or key in self._disk_index
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.audio"
+
+    def _load_index(self):
+        if self.disk_bytes <= 0:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            files = sorted(self.directory.glob("*.audio"), key=lambda p: p.stat().st_mtime)
+        except OSError as e:
+            logger.warning("TTS disk cache unavailable: %s", e)
+            self.disk_bytes = 0
+            return
+        for path in files:
+            size = path.stat().st_size
+            self._disk_index[path.stem] = size
+            self._disk_size += size
+        with self._lock:
+            self._evict_disk()
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._disk_index:
+                return None
+            self._disk_index.move_to_end(key)
+        path = self._path(key)
+        try:
+            audio = path.read_bytes()
+            os.utime(path)
+            return audio
+        except OSError:
+            with self._lock:
+                self._disk_size -= self._disk_index.pop(key, 0)
+            return None
+
+    def _write_disk(self, key: str, audio: bytes):
+        if self.disk_bytes <= 0 or len(audio) > self.disk_bytes:
+            return
+        path = self._path(key)
+        tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            tmp.write_bytes(audio)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Could not write TTS cache entry: %s", e)
+            return
+        with self._lock:
+            self._disk_size -= self._disk_index.pop(key, 0)
+            self._disk_index[key] = len(audio)
+            self._disk_size += len(audio)
+            self._evict_disk()
+
+    def _evict_disk(self):
+        while self._disk_size > self.disk_bytes and self._disk_index:
+            key, size = self._disk_index.popitem(last=False)
+            self._disk_size -= size
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+audio_cache = AudioCache(TTS_CACHE_MEMORY_BYTES, TTS_CACHE_DISK_BYTES, Path(TTS_CACHE_DIR))
+
+def cached_speech(text: str, voice_id: str = DEFAULT_VOICE_ID, style: str = DEFAULT_STYLE) -> Optional[bytes]:
+    """Returns cached audio for text without calling Murf, or None."""
+    return audio_cache.get(text, voice_id, style)
+
+def prewarm(texts: Iterable[str], api_key: str, voice_id: str = DEFAULT_VOICE_ID, style: str = DEFAULT_STYLE) -> int:
+    """Synthesizes every text that is not cached yet; returns how many were fetched."""
+    fetched = 0
+    for text in dict.fromkeys(t.strip() for t in texts if t and t.strip()):
+        if (text, voice_id, style) in audio_cache:
+            continue
+        if speak(text, api_key, voice_id=voice_id, style=style):
+            fetched += 1
+    return fetched
+
+# ---------------- MURF CLIENTS ----------------
+# One Murf client per API key. Each wraps a long-lived httpx.Client, so
+# sentences reuse kept-alive TLS connections instead of handshaking anew.
+_clients: Dict[str, "Murf"] = {}
+_http_clients: Dict[str, httpx.Client] = {}
+_clients_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=None)
+def _sdk():
+    """Imports the Murf SDK once, on first use; returns (Murf class, SDK version)."""
+    from murf import Murf
+    from murf.version import __version__
+    return Murf, __version__
+
+def warm_up():
+    """Loads the Murf SDK ahead of the first reply."""
+    _sdk()
+
+def _get_client(api_key: str) -> "Murf":
+    Murf, murf_version = _sdk()
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            http = httpx.Client(
+                params={"origin": f"python_sdk_{murf_version}"},
+                timeout=TTS_TIMEOUT_SECONDS,
+                follow_redirects=True,
+                limits=httpx.Limits(
+                    max_connections=TTS_GLOBAL_CONCURRENCY,
+                    max_keepalive_connections=TTS_GLOBAL_CONCURRENCY,
+                    keepalive_expiry=TTS_KEEPALIVE_SECONDS,
+                ),
+            )
+            client = Murf(api_key=api_key, httpx_client=http, timeout=TTS_TIMEOUT_SECONDS)
+            _clients[api_key] = client
+            _http_clients[api_key] = http
+        return client
+
+def close_clients():
+    """Closes pooled Murf connections (called on shutdown)."""
+    with _clients_lock:
+        for http in _http_clients.values():
+            try:
+                http.close()
+            except Exception:
+                pass
+        _clients.clear()
+        _http_clients.clear()
+
+# ---------------- SPEECH ----------------
+def speak(
+    text: str,
+    api_key: str,
+    output_file: Optional[str] = None,
+    voice_id: str = DEFAULT_VOICE_ID,
+    style: str = DEFAULT_STYLE,
+    on_chunk: Optional[Callable[[bytes], None]] = None,
+    cancel_event: Optional[threading.Event] = None
+):
+    """
+    Convert text to speech using Murf API.
+    Repeated (text, voice_id, style) requests are served from the audio cache.
+    If output_file is given, the audio is also saved under the uploads folder.
+    If on_chunk is given, each audio chunk is passed to it as Murf streams it
+    (a cache hit arrives as a single chunk). Setting cancel_event aborts the
+    Murf stream at the next chunk.
     Returns bytes of the generated audio or None on failure.
     """
+    cached = audio_cache.get(text, voice_id, style)
+    if cached is not None:
+        if on_chunk:
+            on_chunk(cached)
+        return cached
+
     if not api_key:
         logger.error("Murf API key is missing.")
         return None
 
     try:
-        client = Murf(api_key=api_key)
+        client = _get_client(api_key)
     except Exception as e:
         logger.exception("Failed to create Murf client: %s", e)
         return None
 
-    file_path = UPLOADS_DIR / output_file
-
-    # Start with a clean file
-    try:
-        open(file_path, "wb").close()
-    except Exception:
-        pass
-
+    # Collect chunks and join once: linear in the reply length
+    chunks: List[bytes] = []
     try:
-        res = client.text_to_speech.stream(
-            text=text,
-            voice_id=voice_id,
-            style="Conversational"
-        )
+        with admission.admit("murf", api_key):
+            res = client.text_to_speech.stream(
+                text=text,
+                voice_id=voice_id,
+                style=style
+            )
+            deadline = time.monotonic() + TTS_TIMEOUT_SECONDS
+            for audio_chunk in res:
+                if cancel_event is not None and cancel_event.is_set():
+                    # Closing the generator closes the underlying HTTP stream
+                    res.close()
+                    return None
+                if time.monotonic() > deadline:
+                    res.close()
+                    raise TimeoutError(f"Murf stream took longer than {TTS_TIMEOUT_SECONDS}s")
+                chunks.append(audio_chunk)
+                if on_chunk:
+                    on_chunk(audio_chunk)
+    except admission.AdmissionError as e:
+        logger.warning("Skipping speech: %s", e)
+        return None
     except Exception as e:
         logger.exception("Murf text_to_speech error: %s", e)
+        metrics.upstream_error("murf")
         return None
+    audio_bytes = b"".join(chunks)
 
-    audio_bytes = b""
-    try:
-        for audio_chunk in res:
-            audio_bytes += audio_chunk
-            with open(file_path, "ab") as f:
-                f.write(audio_chunk)
-    except Exception as e:
-        logger.exception("Error while reading streaming audio chunks: %s", e)
-        return None
+    if output_file:
+        try:
+            (UPLOADS_DIR / output_file).write_bytes(audio_bytes)
+        except OSError as e:
+            logger.warning("Could not save TTS audio to %s: %s", output_file, e)
 
+    if audio_bytes:
+        audio_cache.put(text, voice_id, style, audio_bytes)
     return audio_bytes
@@ -14,8 +14,28 @@ document.addEventListener("DOMContentLoaded", () => {
     let audioContext;
     let mediaStream;
     let processor;
+    let mediaRecorder = null;
     let audioQueue = [];
     let isPlaying = false;
+    let pendingAssistant = null; // bubble being filled by assistant_partial updates
+    let audioSegments = new Map(); // "turn:seq" -> chunks of a sentence still streaming in
+    let currentSource = null;
+    let flushedTurn = 0; // audio from this turn id or older was interrupted by the user
+    let playGeneration = 0; // bumped on flush so in-flight decodes are discarded
+
+    // Binary audio frame header (see services/pipeline.py): version, flags, turn id, seq
+    const AUDIO_HEADER_BYTES = 10;
+    const AUDIO_FLAG_END = 0x01;
+
+    // Compressed mic upload (decoded server-side); raw PCM is the fallback
+    const OPUS_MIME = "audio/webm;codecs=opus";
+    const OPUS_BITRATE = 24000;
+    const OPUS_TIMESLICE_MS = 100;
+    const canSendOpus = () => typeof MediaRecorder !== "undefined" && MediaRecorder.isTypeSupported(OPUS_MIME);
+
+    // Compressed speech download (encoded server-side per sentence); MP3 where Ogg/Opus won't decode
+    const OUTPUT_BITRATE_KBPS = 32;
+    const preferredOutputFormat = () => new Audio().canPlayType('audio/ogg; codecs="opus"') ? "opus" : "mp3";
     
     // Load saved API keys
     const loadSettings = () => {
@@ -61,31 +81,103 @@ document.addEventListener("DOMContentLoaded", () => {
         messageDiv.textContent = text;
         chatLog.appendChild(messageDiv);
         chatLog.scrollTop = chatLog.scrollHeight;
+        return messageDiv;
+    };
+
+    // Streamed replies update one bubble in place; the final "assistant" message settles it
+    const updateAssistant = (text, done) => {
+        if (!pendingAssistant) {
+            pendingAssistant = addMessage(text, "assistant");
+        } else {
+            pendingAssistant.textContent = text;
+            chatLog.scrollTop = chatLog.scrollHeight;
+        }
+        if (done) {
+            pendingAssistant = null;
+        }
+    };
+
+    const base64ToArrayBuffer = (base64Audio) => {
+        const binaryString = atob(base64Audio);
+        const len = binaryString.length;
+        const bytes = new Uint8Array(len);
+        for (let i = 0; i < len; i++) {
+            bytes[i] = binaryString.charCodeAt(i);
+        }
+        return bytes.buffer;
+    };
+
+    const enqueueAudio = (audioData, turnId) => {
+        if (turnId !== undefined && turnId <= flushedTurn) return;
+        audioQueue.push(audioData);
+        if (!isPlaying) {
+            playNextInQueue();
+        }
+    };
+
+    // Collects a sentence's streamed chunks and queues it once the END frame arrives
+    const handleAudioFrame = (frame) => {
+        if (frame.byteLength < AUDIO_HEADER_BYTES) return;
+        const view = new DataView(frame);
+        const flags = view.getUint8(1);
+        const turnId = view.getUint32(2);
+        if (turnId <= flushedTurn) return;
+        const key = `${turnId}:${view.getUint32(6)}`;
+        const chunks = audioSegments.get(key) || [];
+        if (frame.byteLength > AUDIO_HEADER_BYTES) {
+            chunks.push(new Uint8Array(frame, AUDIO_HEADER_BYTES));
+        }
+        if (!(flags & AUDIO_FLAG_END)) {
+            audioSegments.set(key, chunks);
+            return;
+        }
+        audioSegments.delete(key);
+        const total = chunks.reduce((n, c) => n + c.byteLength, 0);
+        if (total === 0) return;
+        const audio = new Uint8Array(total);
+        let offset = 0;
+        for (const c of chunks) {
+            audio.set(c, offset);
+            offset += c.byteLength;
+        }
+        enqueueAudio(audio.buffer, turnId);
+    };
+
+    // Barge-in: stop the interrupted answer and drop everything queued for it
+    const flushAudio = (turnId) => {
+        flushedTurn = Math.max(flushedTurn, turnId || 0);
+        audioQueue = [];
+        audioSegments.clear();
+        playGeneration++;
+        if (currentSource) {
+            try { currentSource.stop(); } catch (e) {}
+        }
     };
 
     const playNextInQueue = () => {
         if (audioQueue.length > 0) {
             isPlaying = true;
-            const base64Audio = audioQueue.shift();
-            // convert base64 string to ArrayBuffer
-            const binaryString = atob(base64Audio);
-            const len = binaryString.length;
-            const bytes = new Uint8Array(len);
-            for (let i = 0; i < len; i++) {
-                bytes[i] = binaryString.charCodeAt(i);
-            }
-            const audioData = bytes.buffer;
+            const audioData = audioQueue.shift();
 
             // ensure audioContext is created
             if (!audioContext) {
                 audioContext = new (window.AudioContext || window.webkitAudioContext)({ sampleRate: 16000 });
             }
 
+            const generation = playGeneration;
             audioContext.decodeAudioData(audioData).then(buffer => {
+                if (generation !== playGeneration) {
+                    playNextInQueue();
+                    return;
+                }
                 const source = audioContext.createBufferSource();
                 source.buffer = buffer;
                 source.connect(audioContext.destination);
-                source.onended = playNextInQueue;
+                source.onended = () => {
+                    currentSource = null;
+                    playNextInQueue();
+                };
+                currentSource = source;
                 source.start();
             }).catch(e => {
                 console.error("Error decoding audio data:", e);
@@ -117,47 +209,80 @@ document.addEventListener("DOMContentLoaded", () => {
             mediaStream = await navigator.mediaDevices.getUserMedia({ audio: true });
             audioContext = new (window.AudioContext || window.webkitAudioContext)({ sampleRate: 16000 });
 
-            const source = audioContext.createMediaStreamSource(mediaStream);
-            processor = audioContext.createScriptProcessor(4096, 1, 1);
-            source.connect(processor);
-            processor.connect(audioContext.destination);
-            processor.onaudioprocess = (e) => {
-                const inputData = e.inputBuffer.getChannelData(0);
-                const pcmData = new Int16Array(inputData.length);
-                for (let i = 0; i < inputData.length; i++) {
-                    const s = Math.max(-1, Math.min(1, inputData[i]));
-                    pcmData[i] = s < 0 ? s * 32768 : s * 32767;
-                }
+            const sendAudio = (data) => {
                 if (ws && ws.readyState === WebSocket.OPEN) {
                     try {
-                        ws.send(pcmData.buffer);
+                        ws.send(data);
                     } catch (err) {
                         console.error("WebSocket send error:", err);
                     }
                 }
             };
 
+            // Capture starts once the server has acknowledged the input format
+            const startCapture = (inputFormat) => {
+                if (inputFormat === "webm") {
+                    mediaRecorder = new MediaRecorder(mediaStream, { mimeType: OPUS_MIME, audioBitsPerSecond: OPUS_BITRATE });
+                    mediaRecorder.ondataavailable = (e) => {
+                        if (e.data.size > 0) sendAudio(e.data);
+                    };
+                    mediaRecorder.start(OPUS_TIMESLICE_MS);
+                    return;
+                }
+                const source = audioContext.createMediaStreamSource(mediaStream);
+                processor = audioContext.createScriptProcessor(4096, 1, 1);
+                source.connect(processor);
+                processor.connect(audioContext.destination);
+                processor.onaudioprocess = (e) => {
+                    const inputData = e.inputBuffer.getChannelData(0);
+                    const pcmData = new Int16Array(inputData.length);
+                    for (let i = 0; i < inputData.length; i++) {
+                        const s = Math.max(-1, Math.min(1, inputData[i]));
+                        pcmData[i] = s < 0 ? s * 32768 : s * 32767;
+                    }
+                    sendAudio(pcmData.buffer);
+                };
+            };
+
             const wsProtocol = window.location.protocol === "https:" ? "wss:" : "ws:";
             ws = new WebSocket(`${wsProtocol}//${window.location.host}/ws`);
+            ws.binaryType = "arraybuffer";
 
             ws.onopen = () => {
                 // send config - server may override or use its own keys
-                ws.send(JSON.stringify({ type: "config", keys: apiKeys, persona: selectedPersona }));
+                ws.send(JSON.stringify({ type: "config", keys: apiKeys, persona: selectedPersona, stream: true, audio_protocol: "binary",
+                    input_format: canSendOpus() ? "webm" : "pcm",
+                    output_format: preferredOutputFormat(), output_bitrate: OUTPUT_BITRATE_KBPS,
+                    // Resumes this tab's conversation after a reload or dropped socket
+                    session_token: sessionStorage.getItem("sessionToken"),
+                    // localStorage.setItem("debugTiming", "1") logs per-turn stage timings
+                    debug_timing: localStorage.getItem("debugTiming") === "1" }));
             };
 
             ws.onmessage = (event) => {
+                if (event.data instanceof ArrayBuffer) {
+                    handleAudioFrame(event.data);
+                    return;
+                }
                 try {
                     const msg = JSON.parse(event.data);
-                    if (msg.type === "assistant") {
-                        addMessage(msg.text, "assistant");
+                    if (msg.type === "config_ack") {
+                        if (msg.session_token) sessionStorage.setItem("sessionToken", msg.session_token);
+                        startCapture(msg.input_format);
+                    } else if (msg.type === "assistant") {
+                        updateAssistant(msg.text, true);
+                    } else if (msg.type === "assistant_partial") {
+                        updateAssistant(msg.text, false);
                     } else if (msg.type === "final") {
                         addMessage(msg.text, "user");
                     } else if (msg.type === "audio") {
-                        audioQueue.push(msg.b64);
-                        if (!isPlaying) {
-                            playNextInQueue();
-                        }
+                        enqueueAudio(base64ToArrayBuffer(msg.b64), msg.turn_id);
+                    } else if (msg.type === "flush") {
+                        flushAudio(msg.turn_id);
+                    } else if (msg.type === "timing") {
+                        console.table(msg.spans);
                     } else if (msg.type === "llm_error" || msg.type === "error") {
+                        pendingAssistant = null;
                         addMessage(msg.text || "An error occurred.", "assistant");
                     }
                 } catch (err) {
@@ -183,6 +308,10 @@ document.addEventListener("DOMContentLoaded", () => {
     };
 
     const stopRecording = () => {
+        if (mediaRecorder) {
+            try { mediaRecorder.stop(); } catch (e) {}
+            mediaRecorder = null;
+        }
         if (processor) {
             try { processor.disconnect(); } catch (e) {}
         }